@@ -1,94 +1,668 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Response, Path, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import date
 import database
 import crud
 import schemas
-from apscheduler.schedulers.background import BackgroundScheduler
+import bulk
+import metrics
+import ledger_cache
+from database import run_crud
 from contextlib import asynccontextmanager
-
-database.init_db()
+from scheduler import RecurringScheduler, JobDeferred
+import asyncio
+import functools
+import json
+import os
+import socket
+import threading
+import time
+import uuid
 
 # --- SCHEDULER SETUP ---
-def run_scheduler_job():
-    """Function to run periodically"""
-    db = database.SessionLocal()
+# Every worker process (uvicorn --workers N) runs its own scheduler; the
+# database lease makes sure only one of them processes recurring items at a
+# time. The holder renews the lease after every batch of items it commits,
+# so the TTL bounds one batch rather than a whole catch-up, and a worker
+# that dies mid-run blocks the others for at most the TTL.
+RECURRING_LEASE = "recurring"
+RECURRING_LEASE_TTL_SECONDS = 300
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# The lease is re-entrant for its owner, so runs inside this worker (the
+# scheduler and POST /recurring/process) are serialised by a local lock,
+# one per ledger.
+_recurring_locks = {}
+
+def _process_recurring_with_lease(db: Session, ledger_id: str):
+    lock = _recurring_locks.setdefault(ledger_id, threading.Lock())
+    if not lock.acquire(blocking=False):
+        raise JobDeferred("Recurring processing is already running")
     try:
-        count = crud.process_recurring_transactions(db)
-        if count > 0:
-            print(f"Scheduler: Processed {count} recurring transactions.")
-    except Exception as e:
-        print(f"Scheduler Error: {e}")
+        if not crud.acquire_lease(db, RECURRING_LEASE, WORKER_ID, RECURRING_LEASE_TTL_SECONDS):
+            raise JobDeferred("Recurring processing is running in another worker")
+
+        def renew_lease():
+            if not crud.acquire_lease(db, RECURRING_LEASE, WORKER_ID, RECURRING_LEASE_TTL_SECONDS):
+                # Expired and taken over; the batches committed so far stay
+                raise JobDeferred("Recurring processing was taken over by another worker")
+
+        try:
+            return crud.process_recurring_transactions(db, on_batch=renew_lease)
+        finally:
+            db.rollback()
+            crud.release_lease(db, RECURRING_LEASE, WORKER_ID)
     finally:
-        db.close()
+        lock.release()
+
+def process_recurring_with_lease(db: Session, ledger_id: str = database.DEFAULT_LEDGER):
+    """Raises JobDeferred when another run or worker holds the ledger's lease."""
+    started = time.perf_counter()
+    try:
+        count = _process_recurring_with_lease(db, ledger_id)
+    except JobDeferred:
+        metrics.SCHEDULER_RUNS.inc(ledger=ledger_id, outcome="deferred")
+        raise
+    except Exception:
+        metrics.SCHEDULER_RUNS.inc(ledger=ledger_id, outcome="error")
+        raise
+    metrics.SCHEDULER_RUNS.inc(ledger=ledger_id, outcome="ok")
+    metrics.SCHEDULER_SECONDS.observe(time.perf_counter() - started, ledger=ledger_id)
+    metrics.SCHEDULER_ROWS.inc(count, ledger=ledger_id)
+    metrics.SCHEDULER_LAST_SUCCESS.set(time.time(), ledger=ledger_id)
+    return count
+
+async def process_recurring(ledger_id: str = database.DEFAULT_LEDGER):
+    async with database.session_scope(ledger_id) as db:
+        count = await run_crud(db, process_recurring_with_lease, ledger_id)
+    if count > 0:
+        print(f"Scheduler: Processed {count} recurring transactions (ledger {ledger_id}).")
+    return count
+
+async def load_recurring_schedule(ledger_id: str = database.DEFAULT_LEDGER):
+    async with database.session_scope(ledger_id) as db:
+        return await run_crud(db, crud.get_recurring_schedule)
+
+async def run_scheduler_job(ledger_id: str = database.DEFAULT_LEDGER):
+    """Catch-up run at startup; errors are logged, not raised"""
+    try:
+        return await process_recurring(ledger_id)
+    except JobDeferred:
+        # Another worker is already catching up
+        return 0
+    except Exception as e:
+        print(f"Scheduler Error: {e} (ledger {ledger_id})")
+        return 0
+
+# One scheduler per ledger, each waking up when the earliest next_run_date
+# of its ledger is due; recurring endpoints below keep it in sync. They only
+# hold their ledger's engine open while a run is in progress.
+recurring_schedulers = {}
+
+def get_scheduler(ledger_id: str):
+    scheduler = recurring_schedulers.get(ledger_id)
+    if scheduler is None:
+        scheduler = recurring_schedulers[ledger_id] = RecurringScheduler(
+            job=functools.partial(process_recurring, ledger_id),
+            load_schedule=functools.partial(load_recurring_schedule, ledger_id),
+            name=f"recurring-scheduler-{ledger_id}",
+        )
+    return scheduler
+
+async def start_scheduler(ledger_id: str):
+    """Runs once immediately to catch up missed ones, then waits for due dates. Returns the catch-up count."""
+    count = await run_scheduler_job(ledger_id)
+    await get_scheduler(ledger_id).start()
+    return count
+
+def sync_schedule(ledger_id: str, item):
+    if item.is_active:
+        get_scheduler(ledger_id).schedule(item.id, item.next_run_date)
+    else:
+        get_scheduler(ledger_id).unschedule(item.id)
+
+# --- Startup ---
+# Nothing slow happens at import or before the server accepts connections:
+# a background task brings the schema of every ledger up to date, then
+# catches up on missed recurring items ledger by ledger and warms the ledger
+# cache. Requests to ledger endpoints wait for the schema only; GET /health/ready reports the
+# progress of the rest. A failed migration (e.g. another worker held the
+# lock for longer than busy_timeout) is retried with backoff.
+MIGRATION_RETRY_MAX_SECONDS = 30
+
+class StartupState:
+    def __init__(self):
+        self.phase = "starting"  # migrating, catching_up, warming_cache, done or failed
+        self.started_at = time.time()
+        # Set once the first migration attempt has finished, successful or not
+        self.migration_attempted = asyncio.Event()
+        self.migrated = False
+        self.migration_attempts = 0
+        self.error = None
+        self.ledgers_total = 0
+        self.ledgers_done = 0
+        self.processed = 0
+        self.task = None
+
+    def report(self):
+        return {
+            "phase": self.phase,
+            "seconds": round(time.time() - self.started_at, 3),
+            "schema_ready": self.migrated,
+            "migration_attempts": self.migration_attempts,
+            "catch_up": {"ledgers_done": self.ledgers_done, "ledgers_total": self.ledgers_total,
+                         "processed": self.processed},
+            "error": self.error,
+        }
+
+startup = StartupState()
+
+def _error_text(e: Exception):
+    return f"{type(e).__name__}: {e}"
+
+async def run_startup():
+    startup.phase = "migrating"
+    delay = 1
+    while not startup.migrated:
+        startup.migration_attempts += 1
+        try:
+            await run_in_threadpool(database.init_db)
+            startup.migrated, startup.error = True, None
+        except Exception as e:
+            startup.error = _error_text(e)
+            print(f"Startup Error: {startup.error} (retrying in {delay} s)")
+        finally:
+            # Also on failure, so waiting requests get their 503
+            startup.migration_attempted.set()
+        if not startup.migrated:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MIGRATION_RETRY_MAX_SECONDS)
+
+    # Requests are served from here on; a failure below leaves them alone
+    try:
+        ledger_ids = await run_in_threadpool(database.ledgers.ids)
+        startup.phase, startup.ledgers_total = "catching_up", len(ledger_ids)
+        for ledger_id in ledger_ids:
+            startup.processed += await start_scheduler(ledger_id)
+            startup.ledgers_done += 1
+        startup.phase = "warming_cache"
+        await run_in_threadpool(ledger_cache.warm)
+        startup.phase = "done"
+    except Exception as e:
+        startup.phase, startup.error = "failed", _error_text(e)
+        print(f"Startup Error: {startup.error}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Start Scheduler
-    scheduler = BackgroundScheduler()
-    # Check every hour
-    scheduler.add_job(run_scheduler_job, 'interval', minutes=60)
-    # Also run once immediately on startup to catch up missed ones
-    run_scheduler_job()
-    scheduler.start()
+    startup.task = asyncio.create_task(run_startup(), name="startup")
     yield
     # Shutdown
-    scheduler.shutdown()
+    startup.task.cancel()
+    try:
+        await startup.task
+    except asyncio.CancelledError:
+        pass
+    for scheduler in recurring_schedulers.values():
+        await scheduler.shutdown()
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Every engine, including the ones opened later for other ledgers
+metrics.instrument_engine(Engine)
+
+# Ledger-scoped endpoints live on this router, mounted both at the root
+# (the default ledger) and under /ledgers/{ledger_id} (see the end of the file)
+router = APIRouter()
+
+async def get_ledger_id(request: Request):
+    """The {ledger_id} path parameter under /ledgers/, the default ledger on the root routes."""
+    # Read from the path only: a defaulted parameter would turn into a
+    # ?ledger_id= query parameter on the root routes
+    ledger_id = request.path_params.get("ledger_id", database.DEFAULT_LEDGER)
+    # Without a lifespan (e.g. a bare TestClient) there is no startup to wait for
+    if startup.task is not None and not startup.migrated:
+        # Wait for the first attempt; while failed ones are retried, answer right away
+        await startup.migration_attempted.wait()
+        if not startup.migrated:
+            raise HTTPException(status_code=503, detail=f"Database migrations pending: {startup.error}",
+                                headers={"Retry-After": "1"})
+    if not database.ledgers.exists(ledger_id):
+        raise HTTPException(status_code=404, detail=f"Ledger not found: {ledger_id}")
+    return ledger_id
 
 # Dependency
-def get_db():
-    db = database.SessionLocal()
-    try:
+# Yields an AsyncSession when DB_ASYNC=1, a regular Session otherwise.
+# Endpoints hand it to crud.py through run_crud() either way.
+async def get_db(ledger_id: str = Depends(get_ledger_id)):
+    async with database.session_scope(ledger_id) as db:
         yield db
+
+# --- Conditional GET ---
+# Every write bumps a per-table counter (crud.bump_versions), so a GET whose
+# result only depends on those tables can be validated with one tiny query.
+def _read_versions(db: Session, tables):
+    # Ends the read transaction, so the connection goes back to the pool
+    # before the endpoint's own hop. Otherwise every request waiting for a
+    # thread holds a connection and the pool (not the threads) runs out
+    # under load. The endpoint reads at least these versions, so the tag is
+    # never newer than the data.
+    try:
+        return crud.get_versions(db, tables)
     finally:
-        db.close()
+        db.rollback()
+
+def etag_for(*tables: str):
+    """
+    Dependency for GET endpoints reading `tables`: sets a weak ETag built from
+    their change counters and answers 304 when If-None-Match still matches.
+    """
+    async def check_etag(request: Request, response: Response, db: database.DbSession = Depends(get_db)):
+        versions = await run_crud(db, _read_versions, tables)
+        tag = "-".join(str(versions[table]) for table in tables)
+        # Columnar representations of the same data get their own tag
+        format = bulk.negotiate_columnar(request.headers.get("accept"))
+        etag = f'W/"{tag}-{format}"' if format else f'W/"{tag}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            candidates = {tag.strip() for tag in if_none_match.split(",")}
+            if "*" in candidates or etag in candidates or etag[2:] in candidates:
+                raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+    return check_etag
+
+@router.get("/versions", dependencies=[Depends(etag_for(crud.TRANSACTIONS, crud.ASSETS, crud.RECURRING))])
+async def read_versions(db: database.DbSession = Depends(get_db)):
+    """Change counter per table; clients use it to key their caches."""
+    return await run_crud(db, crud.get_versions)
+
+# --- Health ---
+@app.get("/health/live")
+async def read_liveness():
+    """The process is up and its event loop responds; says nothing about the database."""
+    return {"status": "alive", "startup": startup.report()}
+
+@app.get("/health/ready")
+async def read_readiness():
+    """
+    200 once the schema is up to date and requests are served, 503 before.
+    Recurring catch-up continues in the background; `startup` reports it.
+    """
+    ready = startup.migrated
+    return JSONResponse({"status": "ready" if ready else "starting", "startup": startup.report()},
+                        status_code=200 if ready else 503)
+
+# --- Metrics ---
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """Prometheus scrape target: request, SQL and scheduler metrics of this worker."""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --- Columnar responses ---
+def _columnar_response(format: str, columns, rows, response: Response, next_cursor: Optional[str] = None):
+    # Returning a Response skips the injected one, so carry its headers (ETag) over
+    headers = dict(response.headers)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(bulk.COLUMNAR_ENCODERS[format](columns, rows), media_type=bulk.COLUMNAR_MEDIA_TYPES[format],
+                    headers=headers)
+
+# --- Sync ---
+@router.get("/sync", response_model=schemas.SyncChanges,
+         dependencies=[Depends(etag_for(crud.TRANSACTIONS, crud.ASSETS, crud.RECURRING))])
+async def read_changes(request: Request, response: Response, since: int = Query(0, ge=0),
+                       after_id: Optional[int] = Query(None, ge=0), limit: int = Query(5000, ge=1, le=50000),
+                       tables: Optional[List[str]] = Query(None), db: database.DbSession = Depends(get_db)):
+    """
+    Transactions, asset values and recurring items written after change
+    sequence `since`, plus deleted ids. Start with since=0 and keep the
+    returned `seq`; repeat right away with `seq` and `after_id` while
+    `complete` is false. Repeat `tables` to sync only some tables (the
+    others come back empty). Accept application/x-columns+json returns each
+    table by column.
+    """
+    format = bulk.negotiate_columnar(request.headers.get("accept"), formats=("columns",))
+    try:
+        changes = await run_crud(db, crud.get_changes, since=since, limit=limit, columnar=bool(format),
+                                 after_id=after_id, tables=tables)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not format:
+        return changes
+    for name, columns in crud.SYNC_COLUMNS.items():
+        changes[name] = bulk.to_columns(list(columns), changes[name])
+    return Response(json.dumps(changes, default=str), media_type=bulk.COLUMNAR_MEDIA_TYPES[format],
+                    headers=dict(response.headers))
 
 # --- Transactions ---
-@app.post("/transactions/", response_model=schemas.Transaction)
-def create_transaction(transaction: schemas.TransactionCreate, db: Session = Depends(get_db)):
-    return crud.create_transaction(db=db, transaction=transaction)
+@router.post("/transactions/", response_model=schemas.Transaction)
+async def create_transaction(transaction: schemas.TransactionCreate, db: database.DbSession = Depends(get_db)):
+    return await run_crud(db, crud.create_transaction, transaction=transaction)
+
+@router.get("/transactions/", response_model=List[schemas.Transaction],
+         dependencies=[Depends(etag_for(crud.TRANSACTIONS))])
+async def read_transactions(
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    db: database.DbSession = Depends(get_db),
+):
+    """
+    Transactions ordered by (date, id). Pages are keyset-paginated: pass the
+    X-Next-Cursor header of a response as `cursor` to get the next page.
+    `skip` is still honoured for older clients (offset paging), in either
+    `order`.
+    Accept an Arrow IPC stream or application/x-columns+json to get the
+    page by column.
+    """
+    format = bulk.negotiate_columnar(request.headers.get("accept"))
+    columns = crud.TRANSACTION_EXPORT_COLUMNS if format else None
+    filters = dict(start=start, end=end, type=type, category=category, columns=columns and list(columns))
+    if skip and cursor is None:
+        rows = await run_crud(db, crud.get_transactions, skip=skip, limit=limit, descending=(order == "desc"),
+                              **filters)
+        return _columnar_response(format, columns, rows, response) if format else rows
+    try:
+        rows, next_cursor = await run_crud(
+            db, crud.get_transactions_page, limit=limit, cursor=cursor, descending=(order == "desc"), **filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format:
+        return _columnar_response(format, columns, rows, response, next_cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+@router.get("/transactions/search", response_model=List[schemas.Transaction],
+         dependencies=[Depends(etag_for(crud.TRANSACTIONS))])
+async def search_transactions(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(100, ge=1, le=1000),
+    skip: int = Query(0, ge=0, le=10000),
+    cursor: Optional[str] = None,
+    order: str = Query("rank", pattern="^(rank|asc|desc)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    db: database.DbSession = Depends(get_db),
+):
+    """
+    Full-text search over notes and categories. `q` takes words (all must
+    match), "quoted phrases" and prefixes (amaz*). order=rank returns the
+    best matches first, paged with `skip`; order=asc/desc sorts by date and
+    pages with the X-Next-Cursor header like GET /transactions/.
+    """
+    try:
+        rows, next_cursor = await run_crud(
+            db, crud.search_transactions, q, limit=limit, skip=skip, cursor=cursor, order=order, start=start,
+            end=end, type=type, category=category, min_amount=min_amount, max_amount=max_amount,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+def _import_transactions(ledger_id: str, chunks, format: str):
+    # Pulls the upload from a worker thread, so it always uses a sync session
+    db = database.ledgers.get(ledger_id).SessionLocal()
+    try:
+        return bulk.import_transactions(db, chunks, format)
+    finally:
+        db.close()
+
+@router.post("/transactions/bulk", response_model=schemas.BulkImportResult)
+async def bulk_import_transactions(request: Request, format: Optional[str] = None,
+                                   ledger_id: str = Depends(get_ledger_id)):
+    """
+    Streams a CSV (with a header row) or NDJSON upload in the request body.
+    The format comes from `format` or the Content-Type header. Valid rows are
+    inserted in chunks; invalid ones are reported by row number, as is the
+    row where an unreadable upload (e.g. not UTF-8) stopped the import.
+    """
+    format = format or bulk.format_from_content_type(request.headers.get("content-type"))
+    if format not in bulk.FORMATS:
+        raise HTTPException(status_code=415, detail=f"Unsupported format, use one of: {', '.join(bulk.FORMATS)}")
+    chunks = bulk.iter_async_chunks(request.stream())
+    return await run_in_threadpool(_import_transactions, ledger_id, chunks, format)
+
+# --- Dashboard ---
+@router.get("/dashboard/summary", response_model=schemas.DashboardSummary,
+         dependencies=[Depends(etag_for(crud.TRANSACTIONS))])
+async def read_dashboard_summary(start: Optional[date] = None, end: Optional[date] = None,
+                                 db: database.DbSession = Depends(get_db)):
+    return await run_crud(db, crud.get_dashboard_summary, start=start, end=end)
+
+# --- Analytics ---
+@router.get("/analytics/balance", response_model=schemas.BalanceSeries,
+         dependencies=[Depends(etag_for(crud.TRANSACTIONS))])
+async def read_balance_series(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    resolution: str = Query("auto", pattern="^(auto|day|week|month)$"),
+    points: int = Query(500, ge=10, le=10000),
+    method: str = Query("ohlc", pattern="^(ohlc|lttb)$"),
+    db: database.DbSession = Depends(get_db),
+):
+    """
+    Running balance for charts, downsampled to about `points` points:
+    open/high/low/close per day, week or month, or an LTTB subset of days.
+    """
+    return await run_crud(db, crud.get_balance_series, start=start, end=end, resolution=resolution,
+                          points=points, method=method)
+
+@router.get("/analytics/monthly", response_model=List[schemas.MonthlyTotal],
+         dependencies=[Depends(etag_for(crud.TRANSACTIONS))])
+async def read_monthly_totals(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    db: database.DbSession = Depends(get_db),
+):
+    """Income/expense totals per month and category, read from the monthly rollup."""
+    return await run_crud(db, crud.get_monthly_totals, start=start, end=end, type=type, category=category)
 
-@app.get("/transactions/", response_model=List[schemas.Transaction])
-def read_transactions(skip: int = 0, limit: int = 1000, db: Session = Depends(get_db)):
-    return crud.get_transactions(db, skip=skip, limit=limit)
+@router.get("/analytics/daily/types", response_model=List[schemas.DailyTypeTotal],
+         dependencies=[Depends(etag_for(crud.TRANSACTIONS))])
+async def read_daily_type_totals(request: Request, response: Response, start: Optional[date] = None,
+                                 end: Optional[date] = None, db: database.DbSession = Depends(get_db)):
+    """
+    Income and expense totals per day, without the category split: at most
+    two rows a day, so clients can fetch the whole history once and filter
+    it locally. Accept an Arrow IPC stream or application/x-columns+json to
+    get it by column.
+    """
+    rows = await run_crud(db, crud.get_daily_type_totals, start=start, end=end)
+    format = bulk.negotiate_columnar(request.headers.get("accept"))
+    if format:
+        columns = crud.DAILY_TYPE_TOTAL_COLUMNS
+        return _columnar_response(format, columns, [tuple(row.values()) for row in rows], response)
+    return rows
+
+@router.get("/analytics/daily", response_model=List[schemas.DailyTotal],
+         dependencies=[Depends(etag_for(crud.TRANSACTIONS))])
+async def read_daily_totals(start: Optional[date] = None, end: Optional[date] = None,
+                            db: database.DbSession = Depends(get_db)):
+    """Totals per day, type and category, read from the daily rollup."""
+    return await run_crud(db, crud.get_daily_totals, start=start, end=end)
+
+# No ETag: the projection starts today, so it changes daily without a write
+@router.get("/forecast", response_model=schemas.Forecast)
+async def read_forecast(
+    days: int = Query(365, ge=1, le=40 * 366),
+    resolution: str = Query("month", pattern="^(day|month)$"),
+    db: database.DbSession = Depends(get_db),
+):
+    """
+    Projected balance over the next `days`: today's balance plus every
+    future occurrence of the active recurring items, per day or month.
+    """
+    return await run_crud(db, crud.get_forecast, days=days, resolution=resolution)
+
+# --- Export ---
+def _stream_export(ledger_id: str, format: str, columns, fetch_batches, **filters):
+    # The stream outlives the request handler, so it needs its own session
+    db = database.ledgers.get(ledger_id).SessionLocal()
+    try:
+        yield from bulk.EXPORTERS[format](columns, fetch_batches(db, **filters))
+    finally:
+        db.close()
+
+def _export_response(ledger_id: str, filename: str, format: str, columns, fetch_batches, **filters):
+    if format == "parquet":
+        try:
+            bulk.require_pyarrow()
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    return StreamingResponse(
+        _stream_export(ledger_id, format, columns, fetch_batches, **filters),
+        media_type=bulk.EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'},
+    )
+
+@router.get("/export/transactions")
+def export_transactions(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    ledger_id: str = Depends(get_ledger_id),
+):
+    return _export_response(ledger_id, "transactions", format, crud.TRANSACTION_EXPORT_COLUMNS, crud.iter_transaction_batches,
+                            start=start, end=end, type=type, category=category)
+
+@router.get("/export/assets")
+def export_assets(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    type: Optional[str] = None,
+    name: Optional[str] = None,
+    ledger_id: str = Depends(get_ledger_id),
+):
+    return _export_response(ledger_id, "asset_history", format, crud.ASSET_EXPORT_COLUMNS, crud.iter_asset_batches,
+                            type=type, name=name)
 
 # --- Assets ---
-@app.post("/assets/", response_model=schemas.Asset)
-def create_asset_entry(asset: schemas.AssetCreate, db: Session = Depends(get_db)):
-    return crud.create_asset_value(db=db, asset=asset)
+@router.post("/assets/", response_model=schemas.Asset)
+async def create_asset_entry(asset: schemas.AssetCreate, db: database.DbSession = Depends(get_db)):
+    return await run_crud(db, crud.create_asset_value, asset=asset)
 
-@app.get("/assets/", response_model=List[schemas.Asset])
-def read_assets(db: Session = Depends(get_db)):
-    return crud.get_latest_asset_values(db)
+@router.get("/assets/", response_model=schemas.AssetSnapshot, dependencies=[Depends(etag_for(crud.ASSETS))])
+async def read_assets(db: database.DbSession = Depends(get_db)):
+    """Latest value per (type, name) plus totals per type and net worth."""
+    return await run_crud(db, crud.get_asset_snapshot)
+
+@router.get("/assets/history", response_model=List[schemas.Asset], dependencies=[Depends(etag_for(crud.ASSETS))])
+async def read_asset_history(
+    request: Request,
+    response: Response,
+    limit: int = Query(1000, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    type: Optional[str] = None,
+    name: Optional[str] = None,
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    db: database.DbSession = Depends(get_db),
+):
+    """Every logged asset value, keyset-paginated and negotiated like GET /transactions/."""
+    format = bulk.negotiate_columnar(request.headers.get("accept"))
+    columns = crud.ASSET_EXPORT_COLUMNS if format else None
+    try:
+        rows, next_cursor = await run_crud(
+            db, crud.get_asset_history_page, limit=limit, cursor=cursor, type=type, name=name,
+            descending=(order == "desc"), columns=columns and list(columns),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format:
+        return _columnar_response(format, columns, rows, response, next_cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 # --- Recurring ---
-@app.post("/recurring/", response_model=schemas.Recurring)
-def create_recurring(recurring: schemas.RecurringCreate, db: Session = Depends(get_db)):
-    return crud.create_recurring(db=db, recurring=recurring)
+@router.post("/recurring/", response_model=schemas.Recurring)
+async def create_recurring(recurring: schemas.RecurringCreate, ledger_id: str = Depends(get_ledger_id),
+                           db: database.DbSession = Depends(get_db)):
+    db_item = await run_crud(db, crud.create_recurring, recurring=recurring)
+    sync_schedule(ledger_id, db_item)
+    return db_item
 
-@app.get("/recurring/", response_model=List[schemas.Recurring])
-def read_recurring(db: Session = Depends(get_db)):
-    return crud.get_recurring(db)
+@router.get("/recurring/", response_model=List[schemas.Recurring], dependencies=[Depends(etag_for(crud.RECURRING))])
+async def read_recurring(db: database.DbSession = Depends(get_db)):
+    return await run_crud(db, crud.get_recurring)
 
-@app.put("/recurring/{recurring_id}", response_model=schemas.Recurring)
-def update_recurring(recurring_id: int, recurring_update: schemas.RecurringUpdate, db: Session = Depends(get_db)):
-    db_item = crud.update_recurring(db, recurring_id, recurring_update)
+@router.put("/recurring/{recurring_id}", response_model=schemas.Recurring)
+async def update_recurring(recurring_id: int, recurring_update: schemas.RecurringUpdate,
+                           ledger_id: str = Depends(get_ledger_id), db: database.DbSession = Depends(get_db)):
+    db_item = await run_crud(db, crud.update_recurring, recurring_id, recurring_update)
     if db_item is None:
         raise HTTPException(status_code=404, detail="Recurring transaction not found")
+    sync_schedule(ledger_id, db_item)
     return db_item
 
-@app.delete("/recurring/{recurring_id}", response_model=schemas.Recurring)
-def delete_recurring(recurring_id: int, db: Session = Depends(get_db)):
-    db_item = crud.delete_recurring(db, recurring_id)
+@router.delete("/recurring/{recurring_id}", response_model=schemas.Recurring)
+async def delete_recurring(recurring_id: int, ledger_id: str = Depends(get_ledger_id),
+                           db: database.DbSession = Depends(get_db)):
+    db_item = await run_crud(db, crud.delete_recurring, recurring_id)
     if db_item is None:
         raise HTTPException(status_code=404, detail="Recurring transaction not found")
+    get_scheduler(ledger_id).unschedule(recurring_id)
     return db_item
 
 
 # Manual Trigger endpoint (for testing)
-@app.post("/recurring/process")
-def trigger_recurring_process(db: Session = Depends(get_db)):
-    count = crud.process_recurring_transactions(db)
-    return {"processed": count}
\ No newline at end of file
+@router.post("/recurring/process")
+async def trigger_recurring_process(ledger_id: str = Depends(get_ledger_id),
+                                    db: database.DbSession = Depends(get_db)):
+    try:
+        count = await run_crud(db, process_recurring_with_lease, ledger_id)
+    except JobDeferred as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    await get_scheduler(ledger_id).reload()
+    return {"processed": count}
+
+# --- Ledgers ---
+@app.get("/ledgers", response_model=List[schemas.Ledger])
+async def read_ledgers():
+    """The default ledger plus every ledger created with POST /ledgers."""
+    return [{"id": ledger_id} for ledger_id in await run_in_threadpool(database.ledgers.ids)]
+
+@app.post("/ledgers", response_model=schemas.Ledger, status_code=201)
+async def create_ledger(ledger: schemas.LedgerCreate):
+    """
+    Creates an empty ledger with its own database file. Its endpoints are
+    the ones above under /ledgers/{id}, e.g. GET /ledgers/{id}/transactions/.
+    """
+    try:
+        await run_in_threadpool(database.ledgers.create, ledger.id)
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail=f"Ledger already exists: {ledger.id}")
+    await start_scheduler(ledger.id)
+    return {"id": ledger.id}
+
+def ledger_path(ledger_id: str = Path(..., description="Ledger id, see GET /ledgers")):
+    """Declares {ledger_id} on the prefixed routes (validation, docs); get_ledger_id reads it."""
+    return ledger_id
+
+app.include_router(router)
+app.include_router(router, prefix="/ledgers/{ledger_id}", dependencies=[Depends(ledger_path)])
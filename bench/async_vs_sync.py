@@ -0,0 +1,109 @@
+"""
+Throughput of the API in sync (threadpool) and async (DB_ASYNC=1) mode.
+
+Starts uvicorn once per mode on a throwaway SQLite file, seeds it through
+POST /transactions/bulk, then keeps `--clients` concurrent clients reading
+the dashboard endpoints for `--seconds` and reports requests/s and latency
+percentiles. Needs httpx (pip install -r bench/requirements.txt).
+
+    python bench/async_vs_sync.py --clients 200 --seconds 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import datetime
+
+import httpx
+
+from common import free_port, start_server, wait_ready, percentile
+
+READ_PATHS = [
+    "/dashboard/summary",
+    "/assets/",
+    "/recurring/",
+    "/transactions/?limit=100&order=desc",
+]
+
+def seed_csv(rows, seed=42):
+    rng = random.Random(seed)
+    start = datetime.date.today() - datetime.timedelta(days=3 * 365)
+    lines = ["date,type,category,amount,notes"]
+    for i in range(rows):
+        day = start + datetime.timedelta(days=rng.randrange(3 * 365))
+        kind = "Income" if rng.random() < 0.2 else "Expense"
+        category = rng.choice(["Food", "Rent", "Travel", "Fun", "Bills", "Salary"])
+        lines.append(f"{day},{kind},{category},{rng.uniform(1, 500):.2f},row {i}")
+    return "\n".join(lines).encode()
+
+async def run_load(base_url, clients, seconds):
+    latencies, errors = [], 0
+    deadline = time.monotonic() + seconds
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker(worker_id):
+            nonlocal errors
+            rng = random.Random(worker_id)
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(rng.choice(READ_PATHS))
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(i) for i in range(clients)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+async def bench_mode(mode_async, args, body):
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        server = start_server(os.path.join(tmp, "bench.db"), port, mode_async=mode_async)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+                await wait_ready(client)
+                response = await client.post("/transactions/bulk", content=body, headers={"content-type": "text/csv"})
+                response.raise_for_status()
+            return await run_load(base_url, args.clients, args.seconds)
+        finally:
+            server.terminate()
+            server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=128, help="concurrent clients")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration per mode")
+    parser.add_argument("--rows", type=int, default=50000, help="transactions to seed")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    body = seed_csv(args.rows)
+    results = {}
+    for name, mode_async in (("sync", False), ("async", True)):
+        results[name] = asyncio.run(bench_mode(mode_async, args, body))
+        print(f"{name:>5}: {json.dumps(results[name])}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"clients": args.clients, "rows": args.rows, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
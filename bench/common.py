@@ -0,0 +1,43 @@
+"""Helpers shared by the benchmarks that run the API in a uvicorn process."""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(db_path, port, mode_async=False, workers=1, log=None, output=None):
+    """uvicorn serving api:app on `db_path`; stderr goes to `log` and stdout to `output` when given."""
+    # Unbuffered, so printed lines reach `output` while the server runs
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", DB_ASYNC="1" if mode_async else "0",
+               PYTHONUNBUFFERED="1")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--log-level", "warning",
+         "--workers", str(workers)],
+        cwd=ROOT, env=env, stderr=log, stdout=output,
+    )
+
+async def wait_ready(client, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API did not come up")
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
@@ -0,0 +1,166 @@
+"""
+Seeded synthetic ledger for benchmarks.
+
+Fills a throwaway SQLite database with transactions spread over `--years`
+up to `--today`, recurring items (a share of them due, so
+process_recurring_transactions has catch-up work) and monthly asset
+histories, then rebuilds the rollups and the full-text index. The same
+seed, sizes and `--today` always produce the same database; `--today`
+defaults to the current date, so pin it for baselines compared across days.
+
+    python bench/generate.py /tmp/bench.db --size medium
+    python bench/generate.py /tmp/bench.db --size medium --today 2025-01-01
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import insert
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database  # noqa: E402
+from database import Transaction, AssetValue, RecurringTransaction, TableVersion  # noqa: E402
+
+SIZES = {
+    "small": 10_000,
+    "medium": 1_000_000,
+    "large": 10_000_000,
+}
+# Rows per executemany / database transaction
+INSERT_CHUNK = 100_000
+
+# (category, share of expense rows, median amount)
+EXPENSE_CATEGORIES = [
+    ("Food", 0.30, 18.0), ("Groceries", 0.20, 55.0), ("Transport", 0.15, 12.0),
+    ("Fun", 0.10, 35.0), ("Bills", 0.08, 90.0), ("Travel", 0.04, 300.0),
+    ("Health", 0.05, 40.0), ("Shopping", 0.07, 60.0), ("Rent", 0.01, 1500.0),
+]
+INCOME_CATEGORIES = [("Salary", 0.6, 2500.0), ("Bonus", 0.1, 800.0), ("Interest", 0.3, 15.0)]
+INCOME_SHARE = 0.08
+FREQUENCIES = (["Monthly", "Weekly", "Daily", "Yearly"], [0.6, 0.25, 0.05, 0.1])
+ASSET_TYPES = ["Cash", "Credit Card Debt", "Investment", "Property"]
+
+def _categories(rng, table, n):
+    names, shares, medians = zip(*table)
+    shares = np.array(shares) / sum(shares)
+    picks = rng.choice(len(names), size=n, p=shares)
+    # Log-normal amounts around each category's median
+    amounts = np.round(np.array(medians)[picks] * rng.lognormal(0.0, 0.6, size=n), 2)
+    return np.array(names, dtype=object)[picks], amounts
+
+def transaction_rows(rng, n, first_day: datetime.date, days: int):
+    """Yields lists of row tuples (date, type, category, amount, notes, updated_seq), date-ordered per chunk."""
+    for offset in range(0, n, INSERT_CHUNK):
+        size = min(INSERT_CHUNK, n - offset)
+        day_offsets = np.sort(rng.integers(0, days, size=size))
+        dates = (np.datetime64(first_day) + day_offsets).astype(str)
+        is_income = rng.random(size) < INCOME_SHARE
+        exp_categories, exp_amounts = _categories(rng, EXPENSE_CATEGORIES, size)
+        inc_categories, inc_amounts = _categories(rng, INCOME_CATEGORIES, size)
+        categories = np.where(is_income, inc_categories, exp_categories)
+        amounts = np.where(is_income, inc_amounts, exp_amounts)
+        types = np.where(is_income, "Income", "Expense")
+        yield [
+            (date, kind, category, float(amount), f"gen {offset + i}", 1)
+            for i, (date, kind, category, amount) in enumerate(zip(dates, types, categories, amounts))
+        ]
+
+def recurring_rows(rng, n, today: datetime.date, due_share: float):
+    frequencies, weights = FREQUENCIES
+    for i in range(n):
+        kind = "Income" if rng.random() < 0.15 else "Expense"
+        category, amount = _categories(rng, INCOME_CATEGORIES if kind == "Income" else EXPENSE_CATEGORIES, 1)
+        start = today - datetime.timedelta(days=int(rng.integers(30, 3 * 365)))
+        # Due items are a few weeks behind; the rest run in the future
+        if rng.random() < due_share:
+            next_run = today - datetime.timedelta(days=int(rng.integers(0, 60)))
+        else:
+            next_run = today + datetime.timedelta(days=int(rng.integers(1, 60)))
+        yield {
+            "name": f"Recurring {i}", "type": kind, "category": category[0], "amount": float(amount[0]),
+            "frequency": rng.choice(frequencies, p=weights), "start_date": start,
+            "next_run_date": max(next_run, start), "is_active": 1, "updated_seq": 1,
+        }
+
+def asset_rows(rng, accounts: int, first_day: datetime.date, months: int):
+    for i in range(accounts):
+        type = ASSET_TYPES[i % len(ASSET_TYPES)]
+        value = float(rng.uniform(500, 50_000))
+        for month in range(months):
+            # Random walk, one value per account and month
+            value = max(0.0, value * float(rng.normal(1.005, 0.03)))
+            day = (np.datetime64(first_day, "M") + month).astype("datetime64[D]").item()
+            yield {"date": day, "type": type, "name": f"{type} {i}", "amount": round(value, 2), "updated_seq": 1}
+
+def generate(url: str, transactions: int, recurring: int = 2000, accounts: int = 50, years: int = 5,
+             due_share: float = 0.3, seed: int = 42, today: datetime.date = None, verbose: bool = False):
+    """Creates the schema at `url` and fills it. Returns the engine."""
+    rng = np.random.default_rng(seed)
+    today = today or datetime.date.today()
+    days = years * 365
+    first_day = today - datetime.timedelta(days=days)
+    engine = database.make_engine(url)
+    database.run_migrations(engine)
+
+    # Index the text once at the end instead of row by row through the trigger
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TRIGGER IF EXISTS transactions_fts_insert")
+
+    started = time.perf_counter()
+    columns = "date, type, category, amount, notes, updated_seq"
+    sql = f"INSERT INTO {Transaction.__tablename__} ({columns}) VALUES (?, ?, ?, ?, ?, ?)"
+    inserted = 0
+    for chunk in transaction_rows(rng, transactions, first_day, days):
+        with engine.begin() as conn:
+            conn.exec_driver_sql(sql, chunk)
+        inserted += len(chunk)
+        if verbose:
+            print(f"  {inserted:,} transactions ({inserted / (time.perf_counter() - started):,.0f} rows/s)")
+
+    with engine.begin() as conn:
+        rows = list(recurring_rows(rng, recurring, today, due_share))
+        if rows:
+            conn.execute(insert(RecurringTransaction.__table__), rows)
+        rows = list(asset_rows(rng, accounts, first_day, years * 12))
+        if rows:
+            conn.execute(insert(AssetValue.__table__), rows)
+        database.rebuild_rollup_tables(conn)
+        for statement in database.TRANSACTIONS_FTS_DDL:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')")
+        conn.execute(TableVersion.__table__.delete())
+        conn.execute(insert(TableVersion.__table__), [
+            {"name": name, "version": 1}
+            for name in (database.SYNC_SEQ, Transaction.__tablename__, AssetValue.__tablename__,
+                         RecurringTransaction.__tablename__)
+        ])
+    return engine
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="SQLite file to create (must not exist)")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--transactions", type=int, help="overrides --size")
+    parser.add_argument("--recurring", type=int, default=2000)
+    parser.add_argument("--accounts", type=int, default=50)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--today", type=datetime.date.fromisoformat,
+                        help="last day of the ledger; recurring items are due relative to it (default: today)")
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+
+    transactions = args.transactions or SIZES[args.size]
+    started = time.perf_counter()
+    generate(f"sqlite:///{args.path}", transactions, args.recurring, args.accounts, args.years,
+             seed=args.seed, today=args.today, verbose=True)
+    print(f"Generated {transactions:,} transactions in {time.perf_counter() - started:.1f}s: {args.path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+End-to-end load test: many concurrent clients against a local uvicorn.
+
+Seeds a throwaway database with bench/generate.py, starts the API on it and
+ramps the number of concurrent clients through `--ramp`, `--stage-seconds`
+per stage. Each client keeps picking an operation from `--mix`:
+
+    read       GET of a random dashboard/data endpoint
+    write      POST /transactions/
+    asset      POST /assets/
+    recurring  POST /recurring/ with a daily item starting a month ago, so
+               the scheduler wakes up and commits a catch-up batch
+
+Per stage it reports throughput, p50/p95/p99 latency per operation, HTTP
+and transport errors, and SQLite lock errors counted in the server's log
+(requests that failed with "database is locked", and scheduler runs that
+did). Runs offline; needs httpx (bench/requirements.txt).
+
+    python bench/load.py --mix read=85,write=10,asset=3,recurring=2 --ramp 1,8,32,128
+    python bench/load.py --async --workers 2 --output load.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from common import free_port, start_server, wait_ready, percentile
+
+READ_PATHS = [
+    "/dashboard/summary",
+    "/analytics/balance",
+    "/analytics/daily",
+    "/analytics/monthly",
+    "/assets/",
+    "/recurring/",
+    "/transactions/?limit=100&order=desc",
+    "/versions",
+]
+OPERATIONS = ("read", "write", "asset", "recurring")
+CATEGORIES = ["Food", "Rent", "Travel", "Fun", "Bills", "Salary"]
+
+# Lines of a server log that mark a SQLite lock error
+REQUEST_LOCK_MARKER = "OperationalError: (sqlite3.OperationalError) database is locked"
+SCHEDULER_LOCK_MARKER = "Scheduler Error: (sqlite3.OperationalError) database is locked"
+
+def parse_mix(text):
+    """"read=90,write=10" -> ({operation: weight}); unknown operations are an error."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r}, use {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def request_for(operation, rng):
+    """(method, path, json body) of one operation."""
+    today = datetime.date.today()
+    if operation == "read":
+        return "GET", rng.choice(READ_PATHS), None
+    if operation == "write":
+        return "POST", "/transactions/", {
+            "date": str(today - datetime.timedelta(days=rng.randrange(365))),
+            "type": "Income" if rng.random() < 0.1 else "Expense",
+            "category": rng.choice(CATEGORIES), "amount": round(rng.uniform(1, 500), 2), "notes": "load",
+        }
+    if operation == "asset":
+        return "POST", "/assets/", {
+            "date": str(today), "type": "Cash", "name": f"Account {rng.randrange(20)}",
+            "amount": round(rng.uniform(100, 10_000), 2),
+        }
+    return "POST", "/recurring/", {
+        "name": "load", "type": "Expense", "category": rng.choice(CATEGORIES), "amount": 1.0,
+        "frequency": "Daily", "start_date": str(today - datetime.timedelta(days=30)), "is_active": True,
+    }
+
+def summarize(samples, elapsed):
+    """samples: (latency seconds, outcome) with outcome 'ok', an HTTP status or 'transport'."""
+    latencies = sorted(latency for latency, _ in samples)
+    errors = {}
+    for _, outcome in samples:
+        if outcome != "ok":
+            errors[str(outcome)] = errors.get(str(outcome), 0) + 1
+    return {
+        "requests": len(samples),
+        "requests_per_second": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "error_rate": round(sum(errors.values()) / len(samples), 4) if samples else 0.0,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+async def run_stage(client, clients, seconds, mix, seed):
+    samples = {operation: [] for operation in mix}
+    deadline = time.monotonic() + seconds
+    operations, weights = list(mix), list(mix.values())
+
+    async def worker(worker_id):
+        rng = random.Random(seed * 100_003 + worker_id)
+        while time.monotonic() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            method, path, body = request_for(operation, rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                outcome = "ok" if response.status_code < 400 else response.status_code
+            except httpx.TransportError:
+                outcome = "transport"
+            samples[operation].append((time.perf_counter() - started, outcome))
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker(i) for i in range(clients)))
+    elapsed = time.monotonic() - started
+    result = summarize([sample for values in samples.values() for sample in values], elapsed)
+    result["operations"] = {operation: summarize(values, elapsed) for operation, values in samples.items()}
+    return result
+
+def count_lock_errors(log_path, offset):
+    """(request lock errors, scheduler lock errors, new offset) since `offset` of the server log."""
+    if not log_path:
+        return 0, 0, offset
+    with open(log_path, errors="replace") as f:
+        f.seek(offset)
+        text = f.read()
+        return text.count(REQUEST_LOCK_MARKER), text.count(SCHEDULER_LOCK_MARKER), f.tell()
+
+async def run_ramp(base_url, args, log_path):
+    stages = []
+    limits = httpx.Limits(max_connections=max(args.ramp), max_keepalive_connections=max(args.ramp))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        await wait_ready(client)
+        _, _, offset = count_lock_errors(log_path, 0)
+        for number, clients in enumerate(args.ramp):
+            result = await run_stage(client, clients, args.stage_seconds, args.mix, args.seed + number)
+            result["lock_errors"], result["scheduler_lock_errors"], offset = count_lock_errors(log_path, offset)
+            result["clients"] = clients
+            stages.append(result)
+            print(f"{clients:>5} clients: {result['requests_per_second']:>8} req/s  "
+                  f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  "
+                  f"errors {result['error_rate']:.2%}  lock errors {result['lock_errors']}"
+                  f"/{result['scheduler_lock_errors']} (requests/scheduler)")
+    return stages
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("read=85,write=10,asset=3,recurring=2"),
+                        help="operation weights, e.g. read=85,write=10,asset=3,recurring=2")
+    parser.add_argument("--ramp", type=lambda text: [int(n) for n in text.split(",")], default=[1, 8, 32, 128],
+                        help="concurrent clients per stage")
+    parser.add_argument("--stage-seconds", type=float, default=10.0)
+    parser.add_argument("--transactions", type=int, default=100_000, help="rows to seed")
+    parser.add_argument("--async", dest="mode_async", action="store_true", help="run the API with DB_ASYNC=1")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--url", help="load an already running API instead of starting one")
+    parser.add_argument("--server-log", help="with --url: the server's log (stdout and stderr), for lock errors")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.url:
+        stages = asyncio.run(run_ramp(args.url, args, args.server_log))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path, log_path = os.path.join(tmp, "load.db"), os.path.join(tmp, "server.log")
+            import generate
+
+            generate.generate(f"sqlite:///{db_path}", args.transactions, seed=args.seed).dispose()
+            port = free_port()
+            with open(log_path, "w") as log:
+                # Scheduler errors are printed to stdout, request errors logged to stderr
+                server = start_server(db_path, port, mode_async=args.mode_async, workers=args.workers,
+                                      log=log, output=log)
+                try:
+                    stages = asyncio.run(run_ramp(f"http://127.0.0.1:{port}", args, log_path))
+                finally:
+                    server.terminate()
+                    server.wait()
+
+    if args.output:
+        config = {
+            "mix": args.mix, "ramp": args.ramp, "stage_seconds": args.stage_seconds,
+            "transactions": args.transactions, "async": args.mode_async, "workers": args.workers,
+        }
+        with open(args.output, "w") as f:
+            json.dump({"config": config, "stages": stages}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
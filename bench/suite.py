@@ -0,0 +1,401 @@
+"""
+Micro-benchmarks for the crud hot paths, the API endpoints and the
+dashboard transforms, on a ledger from bench/generate.py, and the cold
+start of both processes (`--only cold_start`).
+
+Every case runs `--repeat` times and reports min/median/mean in ms. Cases
+that write run inside a transaction that is rolled back, so each repeat
+sees the same data. Results go to `--output` as JSON; with `--baseline`
+they are compared against an earlier run, and the exit status is 1 when
+a case got slower than the threshold.
+
+    python bench/suite.py --size small --output results.json
+    python bench/suite.py --size small --baseline results.json
+    python bench/suite.py --db /tmp/bench-1m.db --size medium   # generated once, reused
+"""
+import argparse
+import contextlib
+import datetime
+import functools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH)
+
+# Rows of the transactions frame used for the mirror transforms
+MIRROR_ROWS = 1_000_000
+# Rows per write case (bulk insert, sync delta)
+WRITE_ROWS = 5000
+
+def _summary(times):
+    return {
+        "min_ms": round(min(times) * 1000, 3),
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "mean_ms": round(statistics.fmean(times) * 1000, 3),
+        "runs": len(times),
+    }
+
+def measure(run, repeat: int, warmup: int = 1):
+    """`run` returns its own elapsed seconds (so setup can stay untimed)."""
+    for _ in range(warmup):
+        run()
+    return _summary([run() for _ in range(repeat)])
+
+def timed(fn, *args, **kwargs):
+    def run():
+        started = time.perf_counter()
+        fn(*args, **kwargs)
+        return time.perf_counter() - started
+    return run
+
+def build_cases(n_transactions: int, resources: contextlib.ExitStack):
+    """
+    (name, setup) pairs, where setup() returns the case's run function.
+    Setup shared between cases (the ledger cache, the API client, the
+    mirror frame) happens on first use, so `--only` skips what its cases do
+    not need. Imported here: DATABASE_URL must be set first.
+    """
+    import pandas as pd
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    import crud
+    import database
+    import ledger_cache
+    import transforms
+    from generate import transaction_rows
+    import numpy as np
+
+    db = database.SessionLocal()
+    resources.callback(db.close)
+
+    # pysqlite handles BEGIN/SAVEPOINT itself and gets nested transactions
+    # wrong; this engine leaves them to SQLAlchemy (the documented recipe)
+    write_engine = database.make_engine(os.environ["DATABASE_URL"])
+
+    @event.listens_for(write_engine, "connect")
+    def _autocommit_driver(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(write_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    @contextlib.contextmanager
+    def rolled_back_session():
+        # Commits inside crud only release a savepoint; the outer rollback undoes everything
+        with write_engine.connect() as conn:
+            conn.begin()
+            session = Session(bind=conn, join_transaction_mode="create_savepoint")
+            try:
+                yield session
+            finally:
+                session.close()
+                conn.rollback()
+
+    def writing(fn, *args):
+        def run():
+            with rolled_back_session() as session:
+                started = time.perf_counter()
+                fn(session, *args)
+                return time.perf_counter() - started
+        return run
+
+    @functools.cache
+    def bounds():
+        first, last = crud.get_transaction_date_bounds(db)
+        return first, first + (last - first) / 2, last
+
+    def new_rows():
+        rng = np.random.default_rng(7)
+        return [
+            {"date": datetime.date.fromisoformat(date), "type": type, "category": category, "amount": amount,
+             "notes": notes}
+            for date, type, category, amount, notes, _ in next(transaction_rows(rng, WRITE_ROWS, bounds()[0], 365))
+        ]
+
+    def recurring_items():
+        return db.query(database.RecurringTransaction).filter(database.RecurringTransaction.is_active == 1).all()
+
+    @functools.cache
+    def ledger():
+        # Own instance with no budget limit, independent of LEDGER_CACHE_MB
+        return ledger_cache.LedgerCache(1 << 40).get(db)
+
+    transaction_columns = list(crud.TRANSACTION_EXPORT_COLUMNS)
+    deep_offset = min(n_transactions // 2, 100_000)
+    cases = [
+        ("crud.get_transactions[offset=deep]",
+         lambda: timed(crud.get_transactions, db, skip=deep_offset, limit=100)),
+        ("crud.get_transactions_page[first,desc]",
+         lambda: timed(crud.get_transactions_page, db, limit=1000, descending=True)),
+        ("crud.get_transactions_page[deep cursor]",
+         lambda: timed(crud.get_transactions_page, db, limit=1000, cursor=crud.encode_cursor(bounds()[1], 0))),
+        ("crud.get_transactions_page[columns]",
+         lambda: timed(crud.get_transactions_page, db, limit=1000, columns=transaction_columns)),
+        ("crud.get_dashboard_summary", lambda: timed(crud.get_dashboard_summary, db)),
+        ("crud.get_balance_series[auto]", lambda: timed(crud.get_balance_series, db)),
+        ("crud.get_balance_series[lttb]", lambda: timed(crud.get_balance_series, db, method="lttb")),
+        ("crud.get_monthly_totals", lambda: timed(crud.get_monthly_totals, db)),
+        ("crud.get_daily_totals", lambda: timed(crud.get_daily_totals, db)),
+        ("crud.get_asset_snapshot", lambda: timed(crud.get_asset_snapshot, db)),
+        ("crud.get_asset_history_page", lambda: timed(crud.get_asset_history_page, db, limit=1000)),
+        ("crud.get_changes[since=0]", lambda: timed(crud.get_changes, db, since=0, limit=WRITE_ROWS, columnar=True)),
+        ("ledger_cache.load", lambda: timed(lambda: ledger_cache.LedgerCache(1 << 40).get(db))),
+        ("ledger_cache.daily_balance", lambda: timed(ledger().daily_balance)),
+        ("ledger_cache.period_totals[half]", lambda: timed(ledger().period_totals, *bounds()[1:])),
+        ("ledger_cache.category_totals[half]", lambda: timed(ledger().category_totals, *bounds()[1:])),
+        ("ledger_cache.daily_type_totals[half]", lambda: timed(ledger().daily_type_totals, *bounds()[1:])),
+        ("crud.expand_recurring[10y]",
+         lambda: timed(crud.expand_recurring, recurring_items(), bounds()[2] + datetime.timedelta(days=3650))),
+        ("crud.get_forecast[10y,cached]", lambda: timed(crud.get_forecast, db, days=3650)),
+        ("crud.process_recurring_transactions", lambda: writing(crud.process_recurring_transactions)),
+        ("crud.bulk_create_transactions", lambda: writing(crud.bulk_create_transactions, new_rows())),
+    ]
+
+    @functools.cache
+    def client():
+        from fastapi.testclient import TestClient
+        import api
+        return TestClient(api.app)  # No `with`: the lifespan (scheduler) stays off
+
+    arrow = {"Accept": "application/vnd.apache.arrow.stream"}
+    columns = {"Accept": "application/x-columns+json"}
+
+    def conditional():
+        return {"If-None-Match": client().get("/versions").headers["etag"]}
+
+    def get(path, headers=lambda: {}):
+        return lambda: timed(client().get, path, headers=headers())
+
+    cases += [
+        ("api.GET /transactions/", get("/transactions/?limit=1000")),
+        ("api.GET /transactions/[columns]", get("/transactions/?limit=1000", lambda: columns)),
+        ("api.GET /transactions/[arrow]", get("/transactions/?limit=1000", lambda: arrow)),
+        ("api.GET /transactions/search[phrase]", get('/transactions/search?q="gen 4242"')),
+        ("api.GET /transactions/search[prefix,desc]", get("/transactions/search?q=gen 12*&order=desc")),
+        ("api.GET /dashboard/summary", get("/dashboard/summary")),
+        ("api.GET /analytics/balance", get("/analytics/balance")),
+        ("api.GET /analytics/daily", get("/analytics/daily")),
+        ("api.GET /analytics/daily/types[columns]", get("/analytics/daily/types", lambda: columns)),
+        ("api.GET /analytics/monthly", get("/analytics/monthly")),
+        ("api.GET /assets/", get("/assets/")),
+        ("api.GET /sync[since=0]", get(f"/sync?since=0&limit={WRITE_ROWS}", lambda: columns)),
+        ("api.GET /versions[304]", get("/versions", conditional)),
+    ]
+
+    @functools.cache
+    def period_inputs():
+        daily_columns = client().get("/analytics/daily/types", headers=columns).json()
+        monthly_rows = client().get("/analytics/monthly", params={"type": "Expense"}).json()
+        return daily_columns, monthly_rows
+
+    def period_analysis():
+        daily_columns, monthly_rows = period_inputs()
+        daily_totals = transforms.daily_type_totals_frame(daily_columns)
+        monthly_expenses = transforms.monthly_totals_frame(monthly_rows)
+        first, _, last = bounds()
+        return timed(transforms.period_analysis, daily_totals, monthly_expenses, first, last)
+
+    def merge_changes():
+        mirror = pd.DataFrame(
+            crud.get_transactions(db, limit=MIRROR_ROWS, columns=transaction_columns), columns=transaction_columns
+        )
+        mirror["date"] = mirror["date"].astype(str)
+        delta = mirror.tail(WRITE_ROWS).assign(amount=1.0)
+        return timed(transforms.merge_changes, mirror, delta, [])
+
+    cases += [
+        ("transforms.daily_type_totals_frame",
+         lambda: timed(transforms.daily_type_totals_frame, period_inputs()[0])),
+        ("transforms.monthly_totals_frame", lambda: timed(transforms.monthly_totals_frame, period_inputs()[1])),
+        ("transforms.period_analysis", period_analysis),
+        ("transforms.merge_changes", merge_changes),
+    ]
+    return cases
+
+# --- Cold start ---
+# A fresh interpreter each repeat. The API cases start uvicorn on a fresh
+# copy of a small generated ledger (its due recurring items give the
+# catch-up real work) and time it until GET /health/live answers, until
+# /health/ready does (schema up to date) and until the catch-up is done.
+# The frontend cases run main.py once through Streamlit's AppTest on one
+# page, against an API on another copy.
+COLD_START_TRANSACTIONS = 10_000
+
+FRONTEND_SCRIPT = """
+import sys
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+app.session_state["page"] = sys.argv[2]
+app.run()
+if app.exception:
+    sys.exit(app.exception[0].message)
+"""
+
+def cold_start_cases(workdir: str, resources: contextlib.ExitStack):
+    """(name, setup) pairs like build_cases(); the ledger and the frontend's API are set up on first use."""
+    import shutil
+    import subprocess
+    import httpx
+    from common import free_port, start_server
+
+    pristine = os.path.join(workdir, "cold-start.db")
+    frontend_api = {}
+
+    def fresh_copy(name):
+        if not os.path.exists(pristine):
+            import generate
+            generate.generate(f"sqlite:///{pristine}", COLD_START_TRANSACTIONS).dispose()
+        path = os.path.join(workdir, name)
+        for suffix in ("-wal", "-shm", ""):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        shutil.copy(pristine, path)
+        return path
+
+    def poll(url, done, started, process, timeout=120):
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with {process.returncode}")
+            try:
+                response = httpx.get(url, timeout=5)
+                if done(response):
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.005)
+        raise RuntimeError(f"{url} not done after {timeout} s")
+
+    def api(path, done):
+        def run():
+            db_path, port = fresh_copy("cold-start-api.db"), free_port()
+            started = time.perf_counter()
+            server = start_server(db_path, port, log=subprocess.DEVNULL, output=subprocess.DEVNULL)
+            try:
+                return poll(f"http://127.0.0.1:{port}{path}", done, started, server)
+            finally:
+                server.terminate()
+                server.wait()
+        return run
+
+    def import_api():
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{fresh_copy('cold-start-import.db')}")
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import api"], cwd=ROOT, env=env, check=True)
+        return time.perf_counter() - started
+
+    def frontend(page):
+        def run():
+            if not frontend_api:
+                port = free_port()
+                server = start_server(fresh_copy("cold-start-frontend.db"), port, log=subprocess.DEVNULL,
+                                      output=subprocess.DEVNULL)
+                resources.callback(server.wait)
+                resources.callback(server.terminate)
+                frontend_api["url"] = f"http://127.0.0.1:{port}"
+                poll(f"{frontend_api['url']}/health/ready", lambda r: r.status_code == 200, time.perf_counter(), server)
+            env = dict(os.environ, API_URL=frontend_api["url"])
+            started = time.perf_counter()
+            # Streamlit logs deprecation warnings on every run; only show them on failure
+            result = subprocess.run([sys.executable, "-c", FRONTEND_SCRIPT, os.path.join(ROOT, "main.py"), page],
+                                    cwd=ROOT, env=env, capture_output=True, text=True)
+            elapsed = time.perf_counter() - started
+            if result.returncode:
+                raise RuntimeError(f"main.py failed on {page}:\n{result.stderr[-2000:]}")
+            return elapsed
+        return run
+
+    def caught_up(response):
+        return response.status_code == 200 and response.json()["startup"]["phase"] == "done"
+
+    return [
+        ("cold_start.import api", lambda: import_api),
+        ("cold_start.api[live]", lambda: api("/health/live", lambda r: r.status_code == 200)),
+        ("cold_start.api[ready]", lambda: api("/health/ready", lambda r: r.status_code == 200)),
+        ("cold_start.api[caught up]", lambda: api("/health/ready", caught_up)),
+        ("cold_start.frontend[Quick Add]", lambda: frontend("Quick Add")),
+        ("cold_start.frontend[Dashboard]", lambda: frontend("Dashboard")),
+    ]
+
+def compare(results, baseline, threshold: float):
+    """Prints the median ratio per case; returns the names of regressions."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            print(f"  {name:<45} new")
+            continue
+        ratio = result["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            regressions.append(name)
+        elif ratio < 1 / (1 + threshold):
+            flag = "  faster"
+        print(f"  {name:<45} {before['median_ms']:>10.3f} -> {result['median_ms']:>10.3f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    # Same keys as generate.SIZES; generate is imported once DATABASE_URL is set
+    parser.add_argument("--size", choices=("small", "medium", "large"), default="small")
+    parser.add_argument("--transactions", type=int, help="overrides --size")
+    parser.add_argument("--db", help="generated database to reuse (created if missing)")
+    parser.add_argument("--today", type=datetime.date.fromisoformat,
+                        help="last day of a generated ledger (default: today), see generate.py")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="run the cases whose name contains this")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.ExitStack() as resources:
+        path = args.db or os.path.join(tmp, "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+        import generate
+
+        n_transactions = args.transactions or generate.SIZES[args.size]
+        # The cold start cases bring their own ledger: the benchmark one is
+        # only generated once a case that needs it is selected
+        cases = build_cases(n_transactions, resources) + cold_start_cases(tmp, resources)
+        results = {}
+        for name, setup in cases:
+            if args.only and args.only not in name:
+                continue
+            if not name.startswith("cold_start.") and not os.path.exists(path):
+                print(f"Generating {n_transactions:,} transactions into {path} ...")
+                generate.generate(os.environ["DATABASE_URL"], n_transactions, today=args.today).dispose()
+            results[name] = measure(setup(), args.repeat)
+            print(f"{name:<45} {json.dumps(results[name])}")
+
+    if args.output:
+        meta = {
+            "transactions": n_transactions,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.baseline} ({baseline['meta'].get('transactions', '?'):,} transactions):")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than x{1 + args.threshold:.2f}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Streaming import/export helpers for the ledger.
+
+Uploads are read chunk by chunk, split into lines, parsed and validated
+row by row, so memory use depends on CHUNK_SIZE and not on the file size.
+Exports work the other way round: batches of raw rows from the database
+are serialised and yielded one at a time. List endpoints use the same raw
+rows for their columnar response formats.
+"""
+import codecs
+import csv
+import io
+import json
+import anyio
+from pydantic import ValidationError
+import crud
+import schemas
+
+# Rows validated and inserted per database transaction
+CHUNK_SIZE = 5000
+# Per-row errors beyond this are counted but not reported individually
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+def format_from_content_type(content_type):
+    if not content_type:
+        return None
+    return CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+
+def iter_async_chunks(stream):
+    """Pull chunks of an async byte stream (e.g. Request.stream()) from a worker thread."""
+    iterator = stream.__aiter__()
+    while True:
+        try:
+            yield anyio.from_thread.run(iterator.__anext__)
+        except StopAsyncIteration:
+            return
+
+def iter_lines(chunks, encoding='utf-8-sig'):
+    """
+    Split byte chunks into lines and decode each one (with its newline), so
+    an undecodable byte fails the line it is on. `encoding` must encode
+    '\n' as the single byte 0x0A, like UTF-8 does.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = b''
+    for chunk in chunks:
+        # Only split on \n: str.splitlines() would also break on characters
+        # like U+2028 that may legitimately appear inside a JSON string.
+        *lines, pending = (pending + chunk).split(b'\n')
+        for line in lines:
+            yield decoder.decode(line + b'\n')
+    last = decoder.decode(pending, final=True)
+    if last:
+        yield last
+
+def iter_csv_records(lines):
+    """Yields (row_number, dict). The header row is not counted."""
+    reader = csv.DictReader(lines)
+    for number, row in enumerate(reader, start=1):
+        # Empty cells mean "not set" rather than an empty string
+        yield number, {key: (value if value != '' else None) for key, value in row.items() if key}
+
+def iter_ndjson_records(lines):
+    """Yields (row_number, dict) or (row_number, error) for unparsable lines."""
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, e
+            continue
+        if not isinstance(record, dict):
+            yield number, ValueError("Expected a JSON object")
+            continue
+        yield number, record
+
+def _format_error(error):
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+        )
+    return str(error)
+
+def import_transactions(db, chunks, format: str, chunk_size: int = CHUNK_SIZE):
+    """
+    Validates rows against schemas.TransactionCreate and inserts them with
+    crud.bulk_create_transactions, one database transaction per chunk.
+    Chunks committed before a failure stay committed. An upload that cannot
+    be read any further (bad encoding, broken CSV) stops the import: the rows
+    before it are inserted and the error is reported on the row it hit.
+    """
+    lines = iter_lines(chunks)
+    records = iter_csv_records(lines) if format == 'csv' else iter_ndjson_records(lines)
+
+    result = {"inserted": 0, "failed": 0, "errors": []}
+
+    def reject(number, error):
+        result["failed"] += 1
+        if len(result["errors"]) < MAX_REPORTED_ERRORS:
+            result["errors"].append({"row": number, "error": _format_error(error)})
+
+    batch = []
+    number = 0
+    try:
+        for number, record in records:
+            if isinstance(record, Exception):
+                reject(number, record)
+                continue
+            try:
+                batch.append(schemas.TransactionCreate(**record).model_dump())
+            except ValidationError as e:
+                reject(number, e)
+                continue
+            if len(batch) >= chunk_size:
+                result["inserted"] += crud.bulk_create_transactions(db, batch)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        reject(number + 1, ValueError(f"Import stopped, the upload is unreadable from here: {e}"))
+    if batch:
+        result["inserted"] += crud.bulk_create_transactions(db, batch)
+    return result
+
+# --- Export ---
+EXPORT_MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+def require_pyarrow():
+    """Raises ImportError when the optional pyarrow dependency is missing."""
+    import pyarrow  # noqa: F401
+
+def has_pyarrow():
+    try:
+        require_pyarrow()
+    except ImportError:
+        return False
+    return True
+
+def _arrow_table(schema, rows):
+    import pyarrow as pa
+
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+
+    return pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in columns.items()])
+
+def export_csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when there were no rows at all
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def export_ndjson(columns, batches):
+    names = list(columns)
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(names, row)), default=str) + "\n" for row in batch
+        ).encode()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the caller."""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def export_parquet(columns, batches):
+    """One Parquet row group per batch. `columns` maps names to Arrow type names."""
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(columns)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            writer.write_table(_arrow_table(schema, batch))
+            yield sink.drain()
+    yield sink.drain()
+
+EXPORTERS = {
+    'csv': export_csv,
+    'ndjson': export_ndjson,
+    'parquet': export_parquet,
+}
+
+# --- Columnar responses ---
+# List endpoints answer with one JSON object per row by default. Clients
+# that ask for one of these media types in Accept get the same rows by
+# column instead, encoded straight from the raw row tuples: no Pydantic
+# model per row, and pandas/pyarrow load the columns without reshaping.
+COLUMNAR_MEDIA_TYPES = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'columns': 'application/x-columns+json',
+}
+
+def negotiate_columnar(accept, formats=tuple(COLUMNAR_MEDIA_TYPES)):
+    """
+    One of `formats` or None (row JSON) for an Accept header, following the
+    client's q-values. Arrow is only offered when pyarrow is installed.
+    """
+    if not accept:
+        return None
+    ranges = []
+    for position, media_range in enumerate(accept.split(',')):
+        media_type, *params = [part.strip() for part in media_range.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            ranges.append((-quality, position, media_type.lower()))
+    for _, _, media_type in sorted(ranges):
+        for format in formats:
+            if media_type == COLUMNAR_MEDIA_TYPES[format] and (format != 'arrow' or has_pyarrow()):
+                return format
+        if media_type in ('application/json', 'application/*', '*/*'):
+            return None
+    return None
+
+def to_columns(names, rows):
+    """{name: list of values} from a list of row tuples."""
+    values = list(zip(*rows)) if rows else [()] * len(names)
+    return {name: list(column) for name, column in zip(names, values)}
+
+def encode_columns_json(columns, rows):
+    return json.dumps(to_columns(list(columns), rows), default=str).encode()
+
+def encode_arrow_stream(columns, rows):
+    """Arrow IPC stream with one record batch. `columns` maps names to Arrow type names."""
+    import pyarrow as pa
+
+    schema = _arrow_schema(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(_arrow_table(schema, rows))
+    return sink.getvalue().to_pybytes()
+
+COLUMNAR_ENCODERS = {
+    'arrow': encode_arrow_stream,
+    'columns': encode_columns_json,
+}
@@ -0,0 +1,81 @@
+"""
+HTTP client for the Streamlit frontend.
+
+Streamlit reruns main.py on every interaction, so the connection pool lives
+in st.cache_resource and survives reruns: one keep-alive requests.Session
+per Streamlit server, with timeouts and retries. gather() runs independent
+fetches on a shared thread pool so a page waits for the slowest call, not
+for the sum of them.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from urllib3.util.retry import Retry
+
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (3.05, 30)
+# Retries for connection errors and 502/503/504; POST is never retried
+# because creating a transaction twice is worse than showing an error
+RETRIES = 3
+BACKOFF_SECONDS = 0.2
+# Connections kept alive, and threads used by gather()
+POOL_SIZE = 8
+
+@st.cache_resource
+def get_session():
+    retry = Retry(
+        total=RETRIES,
+        backoff_factor=BACKOFF_SECONDS,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "PUT", "DELETE"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_executor():
+    return ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="api-client")
+
+def request(method: str, path: str, **kwargs):
+    kwargs.setdefault("timeout", TIMEOUT)
+    return get_session().request(method, f"{API_URL}{path}", **kwargs)
+
+def get(path: str, **kwargs):
+    return request("GET", path, **kwargs)
+
+def post(path: str, **kwargs):
+    return request("POST", path, **kwargs)
+
+def put(path: str, **kwargs):
+    return request("PUT", path, **kwargs)
+
+def delete(path: str, **kwargs):
+    return request("DELETE", path, **kwargs)
+
+def gather(*calls):
+    """
+    Runs zero-argument callables concurrently and returns their results in
+    order. The first exception raised by a call is re-raised here.
+    """
+    if len(calls) < 2:
+        return [call() for call in calls]
+    # Lets st.cache_data and friends inside the calls see the current script run
+    ctx = get_script_run_ctx()
+
+    def run(call):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return call()
+
+    futures = [get_executor().submit(run, call) for call in calls]
+    return [future.result() for future in futures]
@@ -1,37 +1,398 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, case, or_, and_, insert, delete, select, text
 import database
-from database import Transaction, AssetValue, RecurringTransaction
+import ledger_cache
+from database import Transaction, AssetValue, RecurringTransaction, SchedulerLease, DailyRollup, MonthlyRollup, TableVersion, SyncTombstone, FtsDeferred
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import schemas
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone
 from dateutil.relativedelta import relativedelta
+import base64
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# --- Versions ---
+# Every write takes the next number of one global change sequence. It is
+# stored as the new version of the tables the write touches and as the
+# updated_seq of the rows it inserts or updates (deletes leave a tombstone),
+# which is what GET /sync filters on.
+TRANSACTIONS = Transaction.__tablename__
+ASSETS = AssetValue.__tablename__
+RECURRING = RecurringTransaction.__tablename__
+SYNC_SEQ = database.SYNC_SEQ
+SYNC_MODELS = {TRANSACTIONS: Transaction, ASSETS: AssetValue, RECURRING: RecurringTransaction}
+
+def bump_versions(db: Session, *tables: str):
+    """
+    Advances the change sequence and stamps it on `tables`. Returns the new
+    sequence number for the rows of this write; call it before writing them.
+    """
+    table = TableVersion.__table__
+    stmt = sqlite_insert(table).values(name=SYNC_SEQ, version=1)
+    db.execute(stmt.on_conflict_do_update(index_elements=['name'], set_={'version': table.c.version + 1}))
+    # The UPDATE above holds SQLite's write lock, nobody else can advance it now
+    seq = get_sync_seq(db)
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(index_elements=['name'], set_={'version': stmt.excluded.version})
+    db.execute(stmt, [{'name': name, 'version': seq} for name in tables])
+    return seq
+
+def get_sync_seq(db: Session):
+    return db.query(TableVersion.version).filter(TableVersion.name == SYNC_SEQ).scalar() or 0
+
+def get_versions(db: Session, tables=None):
+    """{table name: version}; tables that were never written report 0."""
+    names = tables or (TRANSACTIONS, ASSETS, RECURRING)
+    versions = dict(db.query(TableVersion.name, TableVersion.version).filter(TableVersion.name.in_(names)).all())
+    return {name: versions.get(name, 0) for name in names}
+
+# --- Sync ---
+def get_changes(db: Session, since: int = 0, limit: int = 5000, columnar: bool = False, after_id: int = None,
+                tables=None):
+    """
+    Rows of the synced tables written after sequence `since`, plus the ids
+    deleted since then. Transactions are paged on (updated_seq, id), so a
+    page holds at most `limit` of them even when one write stamped many rows
+    with the same sequence (bulk imports, rows from before migration 005).
+    `complete` is False when the client should ask again with `since` and
+    `after_id` set to the returned `seq` and `after_id`.
+    Only `tables` are read (all by default); the others come back empty.
+    With `columnar` the rows are tuples in SYNC_COLUMNS order.
+    Raises ValueError on an unknown table name.
+    """
+    names = list(tables or SYNC_MODELS)
+    unknown = [name for name in names if name not in SYNC_MODELS]
+    if unknown:
+        raise ValueError(f"Unknown table: {unknown[0]!r}, use {', '.join(SYNC_MODELS)}")
+    # Read first: every row up to this sequence is committed by now
+    seq = get_sync_seq(db)
+    changes = {"seq": seq, "after_id": None, "complete": True, "deleted": {}}
+    changes.update({name: [] for name in SYNC_MODELS})
+    if TRANSACTIONS in names:
+        # Transactions are the only table that grows large; size the page on them
+        query = db.query(*_select(Transaction, list(SYNC_COLUMNS[TRANSACTIONS]) if columnar else None)).filter(
+            Transaction.updated_seq <= seq
+        )
+        if after_id is None:
+            query = query.filter(Transaction.updated_seq > since)
+        else:
+            # The rest of sequence `since`, then everything after it
+            query = query.filter(Transaction.updated_seq >= since,
+                                 or_(Transaction.updated_seq > since, Transaction.id > after_id))
+        rows = query.order_by(Transaction.updated_seq, Transaction.id).limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_id = rows[-1].id
+            seq = db.query(Transaction.updated_seq).filter(Transaction.id == last_id).scalar()
+            changes.update(seq=seq, after_id=last_id, complete=False)
+        changes[TRANSACTIONS] = rows
+
+    for name in names:
+        model = SYNC_MODELS[name]
+        if name != TRANSACTIONS:
+            columns = list(SYNC_COLUMNS[name]) if columnar else None
+            changes[name] = db.query(*_select(model, columns)).filter(
+                model.updated_seq > since, model.updated_seq <= seq
+            ).order_by(model.updated_seq, model.id).all()
+        changes["deleted"][name] = [row_id for (row_id,) in db.query(SyncTombstone.row_id).filter(
+            SyncTombstone.table_name == name, SyncTombstone.seq > since, SyncTombstone.seq <= seq
+        ).order_by(SyncTombstone.seq)]
+    return changes
+
+# --- Pagination ---
+# Cursors are an opaque encoding of the (date, id) of the last row on a page.
+# Filtering on that pair instead of OFFSET keeps every page equally cheap.
+def encode_cursor(day: date, row_id: int):
+    return base64.urlsafe_b64encode(f"{day.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    """Returns (date, id). Raises ValueError on a malformed cursor."""
+    try:
+        day, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(day), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def _select(model, columns=None):
+    # Named columns come back as plain row tuples: no ORM object per row
+    return (model,) if columns is None else tuple(getattr(model, column) for column in columns)
+
+def _keyset_page(query, model, limit: int, cursor=None, descending: bool = False):
+    if cursor is not None:
+        day, row_id = decode_cursor(cursor)
+        # The plain range term lets SQLite seek the date index instead of
+        # scanning it from the start; the OR term breaks ties on id.
+        if descending:
+            query = query.filter(model.date <= day,
+                                 or_(model.date < day, and_(model.date == day, model.id < row_id)))
+        else:
+            query = query.filter(model.date >= day,
+                                 or_(model.date > day, and_(model.date == day, model.id > row_id)))
+    if descending:
+        query = query.order_by(model.date.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.date, model.id)
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].date, rows[-1].id)
+    return rows, next_cursor
 
 # --- Transactions ---
-def get_transactions(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Transaction).offset(skip).limit(limit).all()
+def _filter_transactions(query, start=None, end=None, type=None, category=None):
+    query = _filter_date_range(query, start, end)
+    if type is not None:
+        query = query.filter(Transaction.type == type)
+    if category is not None:
+        query = query.filter(Transaction.category == category)
+    return query
+
+def get_transactions(db: Session, skip: int = 0, limit: int = 100, start=None, end=None, type=None, category=None,
+                     descending: bool = False, columns=None):
+    query = _filter_transactions(db.query(*_select(Transaction, columns)), start, end, type, category)
+    if descending:
+        query = query.order_by(Transaction.date.desc(), Transaction.id.desc())
+    else:
+        query = query.order_by(Transaction.date, Transaction.id)
+    return query.offset(skip).limit(limit).all()
+
+def get_transactions_page(db: Session, limit: int = 100, cursor=None, start=None, end=None,
+                          type=None, category=None, descending: bool = False, columns=None):
+    """
+    Returns (rows, next_cursor). next_cursor is None on the last page.
+    With `columns` (names, must include date and id) rows are tuples.
+    """
+    query = _filter_transactions(db.query(*_select(Transaction, columns)), start, end, type, category)
+    return _keyset_page(query, Transaction, limit, cursor, descending)
+
+# --- Search ---
+# Full-text search runs on the FTS5 index (database.transactions_fts); the
+# other filters apply to the matching rows only.
+SEARCH_ORDERS = ('rank', 'asc', 'desc')
+_SEARCH_TERM = re.compile(r'"([^"]*)"?|(\S+)')
+
+def fts_match_expression(q: str):
+    """
+    Turns a user query into an FTS5 MATCH expression. "Quoted words" are a
+    phrase, a trailing * makes a prefix (amaz*), every term must match.
+    Each term is quoted, so FTS5 operators and punctuation in the input are
+    plain text. Raises ValueError when nothing is left to search for.
+    """
+    terms = []
+    for phrase, word in _SEARCH_TERM.findall(q):
+        prefix = not phrase and word.endswith('*')
+        term = (phrase or word.rstrip('*')).strip()
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+    if not terms:
+        raise ValueError("Empty search query")
+    return " ".join(terms)
+
+def search_transactions(db: Session, q: str, limit: int = 100, skip: int = 0, cursor=None, order: str = 'rank',
+                        start=None, end=None, type=None, category=None, min_amount=None, max_amount=None):
+    """
+    Returns (rows, next_cursor) of the transactions matching `q` in their
+    notes or category. order='rank' pages best matches first with `skip`;
+    'asc'/'desc' sort by (date, id) and page with the cursor.
+    """
+    fts = database.transactions_fts
+    query = db.query(Transaction).join(fts, fts.c.rowid == Transaction.id).filter(
+        fts.c.transactions_fts.op('MATCH')(fts_match_expression(q))
+    )
+    query = _filter_transactions(query, start, end, type, category)
+    if min_amount is not None:
+        query = query.filter(Transaction.amount >= min_amount)
+    if max_amount is not None:
+        query = query.filter(Transaction.amount <= max_amount)
+    if order != 'rank':
+        return _keyset_page(query, Transaction, limit, cursor, descending=(order == 'desc'))
+    return query.order_by(fts.c.rank, Transaction.id).offset(skip).limit(limit).all(), None
 
 def create_transaction(db: Session, transaction: schemas.TransactionCreate):
-    db_transaction = Transaction(**transaction.dict())
+    seq = bump_versions(db, TRANSACTIONS)
+    db_transaction = Transaction(**transaction.dict(), updated_seq=seq)
     db.add(db_transaction)
+    apply_rollups(db, [transaction.dict()])
     db.commit()
     db.refresh(db_transaction)
     return db_transaction
 
+def bulk_create_transactions(db: Session, rows):
+    """
+    Inserts a list of plain dicts (TransactionCreate fields) with a single
+    executemany and commits them as one database transaction.
+    """
+    if not rows:
+        return 0
+    seq = bump_versions(db, TRANSACTIONS)
+    # The search index is filled with one INSERT ... SELECT for the whole
+    # batch instead of row by row: the insert trigger stands down while the
+    # FtsDeferred marker exists, which only this transaction ever sees
+    db.execute(insert(FtsDeferred.__table__).values(id=1))
+    # Core insert on the table: skips the ORM unit of work entirely
+    db.execute(insert(Transaction.__table__).values(updated_seq=seq), rows)
+    db.execute(text(
+        "INSERT INTO transactions_fts(rowid, notes, category) "
+        "SELECT id, notes, category FROM transactions WHERE updated_seq = :seq"
+    ), {"seq": seq})
+    db.execute(delete(FtsDeferred.__table__))
+    apply_rollups(db, rows)
+    db.commit()
+    return len(rows)
+
+# --- Rollups ---
+def _upsert_rollup(db: Session, model, key: str, totals):
+    table = model.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key, 'type', 'category'],
+        set_={'total': table.c.total + stmt.excluded.total, 'count': table.c.count + stmt.excluded.count},
+    )
+    db.execute(stmt, [
+        {key: period, 'type': type, 'category': category, 'total': total, 'count': count}
+        for (period, type, category), (total, count) in totals.items()
+    ])
+
+def apply_rollups(db: Session, rows):
+    """
+    Adds new transaction rows (dicts with date/type/category/amount) to the
+    daily and monthly rollups. Call before the commit that inserts the rows.
+    """
+    daily, monthly = {}, {}
+    for row in rows:
+        type, category = row['type'] or '', row['category'] or ''
+        for totals, period in ((daily, row['date']), (monthly, row['date'].replace(day=1))):
+            total, count = totals.get((period, type, category), (0.0, 0))
+            totals[(period, type, category)] = (total + row['amount'], count + 1)
+    if daily:
+        _upsert_rollup(db, DailyRollup, 'day', daily)
+        _upsert_rollup(db, MonthlyRollup, 'month', monthly)
+
+def rebuild_rollups(db: Session):
+    """Recomputes the rollups from scratch, e.g. after editing the database by hand."""
+    database.rebuild_rollup_tables(db)
+    bump_versions(db, TRANSACTIONS, database.LEDGER_RELOAD)
+    db.commit()
+
+def get_monthly_totals(db: Session, start=None, end=None, type=None, category=None):
+    """Totals per (month, type, category) from the monthly rollup."""
+    query = db.query(MonthlyRollup)
+    if start is not None:
+        query = query.filter(MonthlyRollup.month >= start.replace(day=1))
+    if end is not None:
+        query = query.filter(MonthlyRollup.month <= end)
+    if type is not None:
+        query = query.filter(MonthlyRollup.type == type)
+    if category is not None:
+        query = query.filter(MonthlyRollup.category == category)
+    return query.order_by(MonthlyRollup.month, MonthlyRollup.type, MonthlyRollup.category).all()
+
+# --- Export ---
+# Column order and Arrow type names of the exported rows
+TRANSACTION_EXPORT_COLUMNS = {
+    'id': 'int64', 'date': 'date32', 'type': 'string',
+    'category': 'string', 'amount': 'float64', 'notes': 'string', 'recurring_id': 'int64',
+}
+ASSET_EXPORT_COLUMNS = {
+    'id': 'int64', 'date': 'date32', 'type': 'string', 'name': 'string', 'amount': 'float64',
+}
+RECURRING_EXPORT_COLUMNS = {
+    'id': 'int64', 'name': 'string', 'amount': 'float64', 'category': 'string', 'type': 'string',
+    'frequency': 'string', 'start_date': 'date32', 'next_run_date': 'date32', 'is_active': 'int64',
+}
+# Columns of GET /analytics/daily/types by column
+DAILY_TYPE_TOTAL_COLUMNS = {'date': 'date32', 'type': 'string', 'amount': 'float64'}
+# Columns of the synced tables in columnar GET /sync responses
+SYNC_COLUMNS = {
+    TRANSACTIONS: TRANSACTION_EXPORT_COLUMNS,
+    ASSETS: ASSET_EXPORT_COLUMNS,
+    RECURRING: RECURRING_EXPORT_COLUMNS,
+}
+
+def _iter_row_batches(db: Session, stmt, batch_size: int):
+    # yield_per streams from a server-side cursor instead of buffering the result
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+def iter_transaction_batches(db: Session, start=None, end=None, type=None, category=None, batch_size: int = 5000):
+    """Yields lists of raw row tuples (TRANSACTION_EXPORT_COLUMNS order), ordered by (date, id)."""
+    table = Transaction.__table__
+    stmt = select(*(table.c[column] for column in TRANSACTION_EXPORT_COLUMNS))
+    if start is not None:
+        stmt = stmt.where(table.c.date >= start)
+    if end is not None:
+        stmt = stmt.where(table.c.date <= end)
+    if type is not None:
+        stmt = stmt.where(table.c.type == type)
+    if category is not None:
+        stmt = stmt.where(table.c.category == category)
+    return _iter_row_batches(db, stmt.order_by(table.c.date, table.c.id), batch_size)
+
+def iter_asset_batches(db: Session, type=None, name=None, batch_size: int = 5000):
+    """Yields lists of raw row tuples (ASSET_EXPORT_COLUMNS order), ordered by (date, id)."""
+    table = AssetValue.__table__
+    stmt = select(*(table.c[column] for column in ASSET_EXPORT_COLUMNS))
+    if type is not None:
+        stmt = stmt.where(table.c.type == type)
+    if name is not None:
+        stmt = stmt.where(table.c.name == name)
+    return _iter_row_batches(db, stmt.order_by(table.c.date, table.c.id), batch_size)
+
 # --- Assets ---
 def create_asset_value(db: Session, asset: schemas.AssetCreate):
-    db_asset = AssetValue(**asset.dict())
+    seq = bump_versions(db, ASSETS)
+    db_asset = AssetValue(**asset.dict(), updated_seq=seq)
     db.add(db_asset)
     db.commit()
     db.refresh(db_asset)
     return db_asset
 
+# Asset types that count against net worth
+LIABILITY_TYPES = ('Credit Card Debt',)
+
 def get_latest_asset_values(db: Session):
-    return db.query(AssetValue).all()
+    """Latest snapshot per (type, name), picked by the database."""
+    ranked = db.query(
+        AssetValue.id,
+        func.row_number().over(
+            partition_by=(AssetValue.type, AssetValue.name),
+            order_by=(AssetValue.date.desc(), AssetValue.id.desc()),
+        ).label('rank'),
+    ).subquery()
+    return db.query(AssetValue).join(ranked, AssetValue.id == ranked.c.id).filter(
+        ranked.c.rank == 1
+    ).order_by(AssetValue.type, AssetValue.name).all()
+
+def get_asset_snapshot(db: Session):
+    latest = get_latest_asset_values(db)
+    totals = {}
+    for asset in latest:
+        totals[asset.type] = totals.get(asset.type, 0.0) + asset.amount
+    net_worth = sum(-amount if type in LIABILITY_TYPES else amount for type, amount in totals.items())
+    return {"assets": latest, "totals": totals, "net_worth": net_worth}
+
+def get_asset_history_page(db: Session, limit: int = 100, cursor=None, type=None, name=None,
+                           descending: bool = False, columns=None):
+    """Returns (rows, next_cursor) over every logged asset value, see get_transactions_page."""
+    query = db.query(*_select(AssetValue, columns))
+    if type is not None:
+        query = query.filter(AssetValue.type == type)
+    if name is not None:
+        query = query.filter(AssetValue.name == name)
+    return _keyset_page(query, AssetValue, limit, cursor, descending)
 
 # --- Recurring ---
 def create_recurring(db: Session, recurring: schemas.RecurringCreate):
     # Initial next_run_date is start_date
-    db_obj = RecurringTransaction(**recurring.dict(), next_run_date=recurring.start_date)
+    seq = bump_versions(db, RECURRING)
+    db_obj = RecurringTransaction(**recurring.dict(), next_run_date=recurring.start_date, updated_seq=seq)
     db.add(db_obj)
     db.commit()
     db.refresh(db_obj)
@@ -40,6 +401,12 @@ def create_recurring(db: Session, recurring: schemas.RecurringCreate):
 def get_recurring(db: Session):
     return db.query(RecurringTransaction).all()
 
+def get_recurring_schedule(db: Session):
+    """(id, next_run_date) of every active recurring item."""
+    return db.query(RecurringTransaction.id, RecurringTransaction.next_run_date).filter(
+        RecurringTransaction.is_active == 1
+    ).all()
+
 def get_recurring_item(db: Session, recurring_id: int):
     return db.query(RecurringTransaction).filter(RecurringTransaction.id == recurring_id).first()
 
@@ -56,6 +423,7 @@ def update_recurring(db: Session, recurring_id: int, recurring_update: schemas.R
         # Ideally, we should check if frequency/start_date changed and re-compute.
         # For MVP: simple field update.
         
+        db_item.updated_seq = bump_versions(db, RECURRING)
         db.commit()
         db.refresh(db_item)
     return db_item
@@ -63,49 +431,442 @@ def update_recurring(db: Session, recurring_id: int, recurring_update: schemas.R
 def delete_recurring(db: Session, recurring_id: int):
     db_item = db.query(RecurringTransaction).filter(RecurringTransaction.id == recurring_id).first()
     if db_item:
+        seq = bump_versions(db, RECURRING)
         db.delete(db_item)
+        db.add(SyncTombstone(table_name=RECURRING, row_id=recurring_id, seq=seq))
         db.commit()
     return db_item
 
-def process_recurring_transactions(db: Session):
+# Day-based frequencies step with numpy, month-based ones with relativedelta
+FREQUENCY_DAYS = {'Daily': 1, 'Weekly': 7}
+FREQUENCY_MONTHS = {'Monthly': 1, 'Yearly': 12}
+
+def _month_occurrence(anchor: date, months: int):
+    # Always offset from the anchor so the 31st comes back after February
+    return anchor + relativedelta(months=months)
+
+def recurring_occurrences(frequency: str, anchor: date, first: date, until: date):
     """
-    Checks all active recurring transactions. 
-    If next_run_date <= today, create a transaction and update next_run_date.
+    Occurrence dates of a schedule that fall in [first, until], and the first
+    occurrence after `until`. Day-based schedules step from `first`;
+    month-based ones are anchored on the day-of-month of `anchor`.
+    """
+    if frequency in FREQUENCY_DAYS:
+        step = np.timedelta64(FREQUENCY_DAYS[frequency], 'D')
+        dates = np.arange(np.datetime64(first, 'D'), np.datetime64(until, 'D') + 1, step)
+        next_date = dates[-1] + step if len(dates) else np.datetime64(first, 'D')
+        return dates.tolist(), next_date.item()
+
+    if frequency in FREQUENCY_MONTHS:
+        months = FREQUENCY_MONTHS[frequency]
+        # Index of the first occurrence on or after `first`
+        k = max(0, ((first.year - anchor.year) * 12 + first.month - anchor.month) // months)
+        while _month_occurrence(anchor, k * months) < first:
+            k += 1
+        dates = []
+        occurrence = _month_occurrence(anchor, k * months)
+        while occurrence <= until:
+            dates.append(occurrence)
+            k += 1
+            occurrence = _month_occurrence(anchor, k * months)
+        return dates, occurrence
+
+    raise ValueError(f"Unknown frequency: {frequency!r}")
+
+# Recurring items processed per database transaction
+RECURRING_BATCH_SIZE = 1000
+
+def process_recurring_transactions(db: Session, batch_size: int = RECURRING_BATCH_SIZE, on_batch=None):
+    """
+    Checks all active recurring transactions and generates every occurrence
+    between next_run_date and today in one batch, then moves next_run_date
+    past today. Generated rows carry recurring_id; (recurring_id, date) is
+    unique, and occurrences that already exist are skipped, so reruns never
+    duplicate. Due items are handled `batch_size` at a time, each batch in
+    its own transaction; `on_batch()` is called after every commit (the
+    scheduler renews its lease there).
     """
     today = date.today()
-    due_items = db.query(RecurringTransaction).filter(
-        RecurringTransaction.is_active == 1,
-        RecurringTransaction.next_run_date <= today
-    ).all()
-    
-    processed_count = 0
-    
+    processed = 0
+    last_id = 0
+    while True:
+        due_items = db.query(RecurringTransaction).filter(
+            RecurringTransaction.is_active == 1,
+            RecurringTransaction.next_run_date <= today,
+            RecurringTransaction.id > last_id,
+        ).order_by(RecurringTransaction.id).limit(batch_size).all()
+        if not due_items:
+            return processed
+        last_id = due_items[-1].id
+        processed += _process_recurring_batch(db, due_items, today)
+        if on_batch is not None:
+            on_batch()
+
+def _process_recurring_batch(db: Session, due_items, today: date):
+    seq = bump_versions(db, TRANSACTIONS, RECURRING)
+
+    # Occurrences already booked for the due items (one query, uses the unique index)
+    existing = set(db.query(Transaction.recurring_id, Transaction.date).filter(
+        Transaction.recurring_id.in_([item.id for item in due_items]),
+        Transaction.date >= min(item.next_run_date for item in due_items),
+    ).all())
+
+    new_rows = []
     for item in due_items:
-        # 1. Create the Transaction
-        new_txn = Transaction(
-            date=item.next_run_date, # Use the scheduled date, not necessarily today
-            type=item.type,
-            category=item.category,
-            amount=item.amount,
-            notes=f"Auto-generated: {item.name}"
+        if item.frequency not in FREQUENCY_DAYS and item.frequency not in FREQUENCY_MONTHS:
+            continue
+        dates, next_date = recurring_occurrences(
+            item.frequency, item.start_date or item.next_run_date, item.next_run_date, today
         )
-        db.add(new_txn)
-        
-        # 2. Calculate Next Run Date
-        next_date = item.next_run_date
-        if item.frequency == 'Daily':
-            next_date += timedelta(days=1)
-        elif item.frequency == 'Weekly':
-            next_date += timedelta(weeks=1)
-        elif item.frequency == 'Monthly':
-            next_date += relativedelta(months=1)
-        elif item.frequency == 'Yearly':
-            next_date += relativedelta(years=1)
-            
+        for occurrence in dates:
+            if (item.id, occurrence) in existing:
+                continue
+            new_rows.append({
+                "date": occurrence,  # Use the scheduled date, not necessarily today
+                "type": item.type,
+                "category": item.category,
+                "amount": item.amount,
+                "notes": f"Auto-generated: {item.name}",
+                "recurring_id": item.id,
+                "updated_seq": seq,
+            })
         item.next_run_date = next_date
-        processed_count += 1
-    
-    if processed_count > 0:
-        db.commit()
-        
-    return processed_count
\ No newline at end of file
+        item.updated_seq = seq
+
+    if new_rows:
+        db.execute(insert(Transaction.__table__), new_rows)
+        apply_rollups(db, new_rows)
+    db.commit()
+
+    return len(new_rows)
+
+# --- Leases ---
+def _utcnow():
+    # Lease times are stored as naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def acquire_lease(db: Session, name: str, owner: str, ttl_seconds: float):
+    """
+    Takes or renews the lease `name` for `owner`. Succeeds if nobody holds
+    it, `owner` already does, or the current holder's lease has expired.
+    The conditional UPDATE/INSERT is atomic under SQLite's write lock.
+    """
+    now = _utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    updated = db.query(SchedulerLease).filter(
+        SchedulerLease.name == name,
+        or_(SchedulerLease.owner == owner, SchedulerLease.expires_at < now),
+    ).update({"owner": owner, "expires_at": expires_at}, synchronize_session=False)
+    if not updated:
+        db.add(SchedulerLease(name=name, owner=owner, expires_at=expires_at))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Row exists and is held by another live worker
+            db.rollback()
+            return False
+        return True
+    db.commit()
+    return True
+
+def release_lease(db: Session, name: str, owner: str):
+    db.query(SchedulerLease).filter(
+        SchedulerLease.name == name, SchedulerLease.owner == owner
+    ).update({"expires_at": _utcnow()}, synchronize_session=False)
+    db.commit()
+
+# --- Dashboard ---
+# Everything here reads the daily rollup, so the cost depends on the number
+# of (day, type, category) combinations rather than on the number of rows.
+# With LEDGER_CACHE_MB set, the in-memory ledger (ledger_cache.py) answers
+# instead and SQL is only the fallback.
+def _signed_total():
+    # Income counts towards the balance, everything else is money going out
+    return case((DailyRollup.type == 'Income', DailyRollup.total), else_=-DailyRollup.total)
+
+def _filter_date_range(query, start=None, end=None, column=Transaction.date):
+    if start is not None:
+        query = query.filter(column >= start)
+    if end is not None:
+        query = query.filter(column <= end)
+    return query
+
+def _filter_rollup_range(query, start=None, end=None):
+    return _filter_date_range(query, start, end, column=DailyRollup.day)
+
+def get_transaction_date_bounds(db: Session):
+    ledger = ledger_cache.get(db)
+    if ledger is not None:
+        return ledger.date_bounds()
+    return db.query(func.min(DailyRollup.day), func.max(DailyRollup.day)).one()
+
+def get_daily_balance(db: Session, start=None, end=None):
+    """
+    Net flow per day plus the running balance, carried over from
+    everything booked before `start`.
+    """
+    ledger = ledger_cache.get(db)
+    if ledger is not None:
+        return ledger.daily_balance(start, end)
+    opening = 0.0
+    if start is not None:
+        opening = db.query(func.coalesce(func.sum(_signed_total()), 0.0)).filter(
+            DailyRollup.day < start
+        ).scalar()
+
+    net_flow = func.sum(_signed_total())
+    query = db.query(
+        DailyRollup.day,
+        net_flow,
+        func.sum(net_flow).over(order_by=DailyRollup.day),
+    )
+    rows = _filter_rollup_range(query, start, end).group_by(DailyRollup.day).order_by(DailyRollup.day).all()
+    return [
+        {"date": day, "net_flow": flow, "running_balance": opening + running}
+        for day, flow, running in rows
+    ]
+
+# Downsampled running balance for charts: a fixed number of points no
+# matter how long the history is.
+BALANCE_RESOLUTIONS = ('day', 'week', 'month')
+
+def _bucket_starts(days, resolution: str):
+    """First day of the day/week/month bucket of every datetime64[D] in `days`."""
+    if resolution == 'week':
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday
+        return days - (days.astype(np.int64) + 3) % 7
+    if resolution == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    return days
+
+def _lttb(x, y, threshold: int):
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps out of (x, y):
+    the first and last point plus, per bucket, the one spanning the largest
+    triangle with its neighbours, so peaks and troughs survive.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # Bucket boundaries over the inner points 1..n-2
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = [0]
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        a = selected[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        selected.append(lo + int(area.argmax()))
+    selected.append(n - 1)
+    return np.array(selected)
+
+def get_balance_series(db: Session, start=None, end=None, resolution: str = 'auto', points: int = 500,
+                       method: str = 'ohlc'):
+    """
+    Running balance downsampled to about `points` points. 'ohlc' buckets the
+    days per day/week/month ('auto' picks the finest that fits) and keeps
+    open/high/low/close of each bucket; 'lttb' keeps a subset of the days.
+    """
+    daily = get_daily_balance(db, start, end)
+    if not daily:
+        return {"first_date": None, "last_date": None, "resolution": resolution, "method": method, "points": []}
+    days = np.array([row["date"] for row in daily], dtype='datetime64[D]')
+    flow = np.array([row["net_flow"] for row in daily], dtype=float)
+    balance = np.array([row["running_balance"] for row in daily], dtype=float)
+    # Balance before each day's flow
+    before = balance - flow
+
+    if method == 'lttb':
+        resolution = 'day'
+        keep = _lttb(days.astype(np.int64).astype(float), balance, points)
+        starts = keep
+        open_ = np.concatenate(([before[0]], balance[keep[:-1]]))
+        close = high = low = balance[keep]
+    else:
+        if resolution == 'auto':
+            resolution = next(
+                (r for r in BALANCE_RESOLUTIONS if len(np.unique(_bucket_starts(days, r))) <= points), 'month'
+            )
+        keys = _bucket_starts(days, resolution)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(days)] - 1
+        open_ = before[starts]
+        close = balance[ends]
+        high = np.maximum(np.maximum.reduceat(balance, starts), open_)
+        low = np.minimum(np.minimum.reduceat(balance, starts), open_)
+        days = keys
+
+    return {
+        "first_date": daily[0]["date"],
+        "last_date": daily[-1]["date"],
+        "resolution": resolution,
+        "method": method,
+        "points": [
+            {"date": day, "open": o, "high": h, "low": l, "close": c, "net_flow": c - o}
+            for day, o, h, l, c in zip(days[starts].tolist(), open_.tolist(), high.tolist(), low.tolist(),
+                                       close.tolist())
+        ],
+    }
+
+def get_period_totals(db: Session, start=None, end=None):
+    ledger = ledger_cache.get(db)
+    if ledger is not None:
+        return ledger.period_totals(start, end)
+    query = db.query(DailyRollup.type, func.sum(DailyRollup.total))
+    totals = dict(_filter_rollup_range(query, start, end).group_by(DailyRollup.type).all())
+    income = totals.get('Income') or 0.0
+    expenses = totals.get('Expense') or 0.0
+    return {"income": income, "expenses": expenses, "savings": income - expenses}
+
+def get_category_totals(db: Session, start=None, end=None, type: str = 'Expense'):
+    ledger = ledger_cache.get(db)
+    if ledger is not None:
+        return ledger.category_totals(start, end, type)
+    query = db.query(DailyRollup.category, func.sum(DailyRollup.total)).filter(DailyRollup.type == type)
+    rows = _filter_rollup_range(query, start, end).group_by(DailyRollup.category).all()
+    return [{"category": category, "amount": amount} for category, amount in rows]
+
+def get_daily_type_totals(db: Session, start=None, end=None):
+    ledger = ledger_cache.get(db)
+    if ledger is not None:
+        return ledger.daily_type_totals(start, end)
+    query = db.query(DailyRollup.day, DailyRollup.type, func.sum(DailyRollup.total))
+    rows = _filter_rollup_range(query, start, end).group_by(DailyRollup.day, DailyRollup.type).order_by(DailyRollup.day).all()
+    return [{"date": day, "type": type, "amount": amount} for day, type, amount in rows]
+
+def get_daily_totals(db: Session, start=None, end=None):
+    """Raw daily rollup rows (day, type, category), small enough to filter client-side."""
+    query = _filter_rollup_range(db.query(DailyRollup), start, end)
+    return query.order_by(DailyRollup.day, DailyRollup.type, DailyRollup.category).all()
+
+def get_dashboard_summary(db: Session, start=None, end=None):
+    first_date, last_date = get_transaction_date_bounds(db)
+    return {
+        "first_date": first_date,
+        "last_date": last_date,
+        "totals": get_period_totals(db, start, end),
+        "balance": get_daily_balance(db, start, end),
+        "expense_categories": get_category_totals(db, start, end),
+        "daily_trend": get_daily_type_totals(db, start, end),
+    }
+
+def get_closing_balance(db: Session):
+    """Net of every transaction booked so far (the last running balance)."""
+    ledger = ledger_cache.get(db)
+    if ledger is not None:
+        return ledger.closing_balance()
+    return db.query(func.coalesce(func.sum(_signed_total()), 0.0)).scalar()
+
+# --- Forecast ---
+# Projects the balance by expanding every active recurring item into its
+# future occurrences, all items at once with NumPy date arithmetic (same
+# dates as recurring_occurrences()). The expansion only depends on the
+# recurring items, so it is cached per recurring version and day.
+FORECAST_RESOLUTIONS = ('day', 'month')
+FORECAST_CACHE_SIZE = 32
+_forecast_cache = OrderedDict()
+_forecast_lock = threading.Lock()
+
+def _group_arange(counts):
+    """0..n-1 for every n in `counts`, concatenated."""
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+def _month_occurrences(anchor, months, k):
+    """anchor + k * months months, on the anchor's day clipped to the month's end (vectorized)."""
+    anchor_month = anchor.astype('datetime64[M]')
+    day = (anchor - anchor_month.astype('datetime64[D]')).astype(np.int64)
+    month = anchor_month + k * months
+    month_start = month.astype('datetime64[D]')
+    month_length = ((month + 1).astype('datetime64[D]') - month_start).astype(np.int64)
+    return month_start + np.minimum(day, month_length - 1)
+
+def expand_recurring(items, until: date):
+    """
+    (dates, signed amounts) of every occurrence of `items` from their
+    next_run_date up to `until`. Items need frequency, start_date,
+    next_run_date, type and amount; unknown frequencies are skipped.
+    """
+    until = np.datetime64(until, 'D')
+    dates, amounts = [], []
+
+    def signed(rows):
+        return np.array([(row.amount or 0.0) * (1 if row.type == 'Income' else -1) for row in rows], dtype=float)
+
+    by_days = [item for item in items if item.frequency in FREQUENCY_DAYS]
+    if by_days:
+        first = np.array([item.next_run_date for item in by_days], dtype='datetime64[D]')
+        step = np.array([FREQUENCY_DAYS[item.frequency] for item in by_days], dtype=np.int64)
+        counts = np.maximum((until - first).astype(np.int64) // step + 1, 0)
+        dates.append(np.repeat(first, counts) + np.repeat(step, counts) * _group_arange(counts))
+        amounts.append(np.repeat(signed(by_days), counts))
+
+    by_months = [item for item in items if item.frequency in FREQUENCY_MONTHS]
+    if by_months:
+        first = np.array([item.next_run_date for item in by_months], dtype='datetime64[D]')
+        anchor = np.array([item.start_date or item.next_run_date for item in by_months], dtype='datetime64[D]')
+        months = np.array([FREQUENCY_MONTHS[item.frequency] for item in by_months], dtype=np.int64)
+        anchor_month = anchor.astype('datetime64[M]')
+        # First k with an occurrence on or after next_run_date, last one on or before `until`
+        k_first = np.maximum((first.astype('datetime64[M]') - anchor_month).astype(np.int64) // months, 0)
+        k_first += _month_occurrences(anchor, months, k_first) < first
+        k_last = (until.astype('datetime64[M]') - anchor_month).astype(np.int64) // months
+        k_last -= _month_occurrences(anchor, months, k_last) > until
+        counts = np.maximum(k_last - k_first + 1, 0)
+        k = np.repeat(k_first, counts) + _group_arange(counts)
+        dates.append(_month_occurrences(np.repeat(anchor, counts), np.repeat(months, counts), k))
+        amounts.append(np.repeat(signed(by_months), counts))
+
+    if not dates:
+        return np.empty(0, dtype='datetime64[D]'), np.empty(0, dtype=float)
+    return np.concatenate(dates), np.concatenate(amounts)
+
+def _forecast_flows(db: Session, today: date, days: int):
+    """Net recurring flow per day for today + 0..days; occurrences still due from the past count today."""
+    key = (str(db.get_bind().url), get_versions(db, (RECURRING,))[RECURRING], today)
+    with _forecast_lock:
+        flows = _forecast_cache.get(key)
+        if flows is not None:
+            _forecast_cache.move_to_end(key)
+    if flows is not None and len(flows) > days:
+        return flows[:days + 1]
+
+    items = db.query(
+        RecurringTransaction.frequency, RecurringTransaction.start_date, RecurringTransaction.next_run_date,
+        RecurringTransaction.type, RecurringTransaction.amount,
+    ).filter(RecurringTransaction.is_active == 1, RecurringTransaction.next_run_date.isnot(None)).all()
+    dates, amounts = expand_recurring(items, today + timedelta(days=days))
+    offsets = np.maximum((dates - np.datetime64(today, 'D')).astype(np.int64), 0)
+    flows = np.bincount(offsets, weights=amounts, minlength=days + 1)
+    with _forecast_lock:
+        _forecast_cache[key] = flows
+        while len(_forecast_cache) > FORECAST_CACHE_SIZE:
+            _forecast_cache.popitem(last=False)
+    return flows
+
+def get_forecast(db: Session, days: int = 365, resolution: str = 'month'):
+    """
+    Projected balance from today to today + `days`: the current balance plus
+    the active recurring items' occurrences, per day or per month (balance
+    at the end of the month, net flow within it).
+    """
+    today = date.today()
+    opening = get_closing_balance(db)
+    flows = _forecast_flows(db, today, days)
+    balance = opening + np.cumsum(flows)
+    day_dates = np.datetime64(today, 'D') + np.arange(len(flows))
+    if resolution == 'month':
+        keys = _bucket_starts(day_dates, 'month')
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(flows)] - 1
+        day_dates, flows, balance = keys[starts], np.add.reduceat(flows, starts), balance[ends]
+    return {
+        "start": today,
+        "end": today + timedelta(days=days),
+        "resolution": resolution,
+        "opening_balance": opening,
+        "points": [
+            {"date": day, "net_flow": flow, "balance": value}
+            for day, flow, value in zip(day_dates.tolist(), flows.tolist(), balance.tolist())
+        ],
+    }
@@ -1,7 +1,23 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Date
+from sqlalchemy import create_engine, Column, Integer, String, Float, Date, DateTime, Index, text, inspect, event, select, delete, func
+from sqlalchemy import table, column, MetaData
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from contextlib import asynccontextmanager
+import anyio
+import asyncio
 import datetime
+import functools
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 Base = declarative_base()
 
@@ -14,6 +30,18 @@ class Transaction(Base):
     category = Column(String)
     amount = Column(Float)
     notes = Column(String)
+    # Set on rows generated from a RecurringTransaction. Together with the
+    # date it is the idempotency key of a generated occurrence.
+    recurring_id = Column(Integer, nullable=True)
+    # Change sequence of the last write to the row (see TableVersion)
+    updated_seq = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index('ix_transactions_date', 'date'),
+        Index('ix_transactions_type_date', 'type', 'date'),
+        Index('ux_transactions_recurring_date', 'recurring_id', 'date', unique=True),
+        Index('ix_transactions_updated_seq', 'updated_seq'),
+    )
 
     def __repr__(self):
         return f"<Transaction(date={self.date}, type={self.type}, amount={self.amount}, category={self.category})>"
@@ -26,6 +54,13 @@ class AssetValue(Base):
     type = Column(String) # 'Cash', 'Credit Card Debt', 'Investment', 'Property'
     name = Column(String) # e.g. "Chase Checking", "Amex", "Vanguard", "Main St House"
     amount = Column(Float)
+    updated_seq = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index('ix_asset_values_type_name_date', 'type', 'name', 'date'),
+        Index('ix_asset_values_date', 'date'),
+        Index('ix_asset_values_updated_seq', 'updated_seq'),
+    )
 
 class RecurringTransaction(Base):
     __tablename__ = 'recurring_transactions'
@@ -39,11 +74,529 @@ class RecurringTransaction(Base):
     start_date = Column(Date)
     next_run_date = Column(Date)
     is_active = Column(Integer, default=1) # 1=Active, 0=Paused
+    updated_seq = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index('ix_recurring_transactions_active_next_run', 'is_active', 'next_run_date'),
+        Index('ix_recurring_transactions_updated_seq', 'updated_seq'),
+        # Generated transactions point at their item through recurring_id, so
+        # the id of a deleted item must never be handed out again
+        {'sqlite_autoincrement': True},
+    )
+
+class DailyRollup(Base):
+    """
+    Sum and count of transactions per (day, type, category), kept up to date
+    in the same database transaction as every insert done through crud.py.
+    A NULL type/category is stored as ''.
+    """
+    __tablename__ = 'transaction_daily_rollups'
+
+    day = Column(Date, primary_key=True)
+    type = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+class MonthlyRollup(Base):
+    """Same as DailyRollup per (month, type, category); month is the 1st of the month."""
+    __tablename__ = 'transaction_monthly_rollups'
+
+    month = Column(Date, primary_key=True)
+    type = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+def rebuild_rollup_tables(conn):
+    """Recomputes both rollup tables from `transactions`. Caller commits."""
+    conn.execute(delete(DailyRollup))
+    conn.execute(delete(MonthlyRollup))
+    conn.execute(DailyRollup.__table__.insert().from_select(
+        ['day', 'type', 'category', 'total', 'count'],
+        select(
+            Transaction.date,
+            func.coalesce(Transaction.type, ''),
+            func.coalesce(Transaction.category, ''),
+            func.sum(Transaction.amount),
+            func.count(),
+        ).group_by(Transaction.date, func.coalesce(Transaction.type, ''), func.coalesce(Transaction.category, '')),
+    ))
+    month = func.date(DailyRollup.day, 'start of month')
+    conn.execute(MonthlyRollup.__table__.insert().from_select(
+        ['month', 'type', 'category', 'total', 'count'],
+        select(
+            month, DailyRollup.type, DailyRollup.category,
+            func.sum(DailyRollup.total), func.sum(DailyRollup.count),
+        ).group_by(month, DailyRollup.type, DailyRollup.category),
+    ))
+
+# Full-text index over transactions.notes/category (SQLite FTS5). It is an
+# external-content table: it stores only the index, the text stays in
+# `transactions`, and triggers keep the two in sync for every write,
+# including raw executemany inserts and hand edits. Bulk imports index each
+# batch in one statement instead: they hold a FtsDeferred row for the length
+# of their transaction, which the insert trigger's WHEN clause checks.
+# Created by migration 6, the WHEN clause added by migration 8.
+# Prefix indexes make "amaz*" as cheap as a whole-word lookup.
+class FtsDeferred(Base):
+    """
+    Marker of a transaction that indexes its inserts itself (see
+    crud.bulk_create_transactions). Inserted and deleted again before the
+    commit, so other connections never see a row.
+    """
+    __tablename__ = 'fts_deferred'
+
+    id = Column(Integer, primary_key=True)
+
+TRANSACTIONS_FTS_INSERT_TRIGGER = (
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions "
+    "WHEN NOT EXISTS (SELECT 1 FROM fts_deferred) BEGIN "
+    "INSERT INTO transactions_fts(rowid, notes, category) VALUES (new.id, new.notes, new.category); END"
+)
+TRANSACTIONS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5("
+    "notes, category, content='transactions', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    TRANSACTIONS_FTS_INSERT_TRIGGER,
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN "
+    "INSERT INTO transactions_fts(transactions_fts, rowid, notes, category) "
+    "VALUES ('delete', old.id, old.notes, old.category); END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF notes, category ON transactions BEGIN "
+    "INSERT INTO transactions_fts(transactions_fts, rowid, notes, category) "
+    "VALUES ('delete', old.id, old.notes, old.category); "
+    "INSERT INTO transactions_fts(rowid, notes, category) VALUES (new.id, new.notes, new.category); END",
+]
+
+# Not part of Base.metadata: create_all() cannot create virtual tables.
+# The hidden column named like the table is the MATCH target, rank is bm25().
+transactions_fts = table('transactions_fts', column('rowid'), column('rank'), column('transactions_fts'))
+
+# Name of the TableVersion row holding the global change sequence
+SYNC_SEQ = '_seq'
+# Bumped when transactions may have changed other than by inserts (e.g. a
+# rollup rebuild after editing the database by hand): in-memory copies reload
+LEDGER_RELOAD = '_reload'
+
+class TableVersion(Base):
+    """
+    Change counter per table, bumped in the same database transaction as
+    every write done through crud.py. The API derives ETags from it.
+    The SYNC_SEQ row is the global sequence the table versions and the
+    rows' updated_seq are taken from.
+    """
+    __tablename__ = 'table_versions'
+
+    name = Column(String, primary_key=True) # Table name, e.g. "transactions"
+    version = Column(Integer, nullable=False, default=0)
+
+class SyncTombstone(Base):
+    """Id of a deleted row and the change sequence of its delete, for GET /sync."""
+    __tablename__ = 'sync_tombstones'
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    seq = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index('ix_sync_tombstones_seq', 'seq'),
+    )
+
+class SchedulerLease(Base):
+    """
+    Named lease so only one API worker runs a background job at a time.
+    A worker holds it until expires_at; a crashed holder's lease simply
+    runs out and another worker takes over.
+    """
+    __tablename__ = 'scheduler_leases'
+
+    name = Column(String, primary_key=True) # e.g. "recurring"
+    owner = Column(String) # host:pid:nonce of the holding worker
+    expires_at = Column(DateTime) # naive UTC
 
 # Database setup
-DATABASE_URL = "sqlite:///financial_data.db"
-engine = create_engine(DATABASE_URL)
+# Everything below can be overridden with environment variables.
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///financial_data.db")
+
+# Applied to every new SQLite connection. WAL lets readers run while the
+# scheduler or an import is writing; busy_timeout makes writers wait for the
+# lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -64000)),  # Negative means KiB
+}
+
+# Connections kept open per process, and extra ones allowed under load
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+def make_engine(url: str = DATABASE_URL, **kwargs):
+    """Engine with the pool and PRAGMA profile above (PRAGMAs for SQLite only)."""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        kwargs.setdefault("pool_size", DB_POOL_SIZE)
+        kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+        kwargs.setdefault("pool_timeout", DB_POOL_TIMEOUT)
+        kwargs.setdefault("pool_pre_ping", True)
+        return create_engine(url, **kwargs)
+
+    # Sessions move between FastAPI's threadpool and the scheduler thread
+    connect_args = kwargs.pop("connect_args", {})
+    connect_args.setdefault("check_same_thread", False)
+    connect_args.setdefault("timeout", SQLITE_PRAGMAS["busy_timeout"] / 1000)
+    if url.database in (None, "", ":memory:"):
+        # Every connection would get its own empty in-memory database
+        kwargs.setdefault("poolclass", StaticPool)
+    else:
+        kwargs.setdefault("pool_size", DB_POOL_SIZE)
+        kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+        kwargs.setdefault("pool_timeout", DB_POOL_TIMEOUT)
+    engine = create_engine(url, connect_args=connect_args, **kwargs)
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# --- Async mode ---
+# With DB_ASYNC=1 the API talks to the database through an AsyncEngine
+# (aiosqlite for SQLite) on the event loop instead of FastAPI's threadpool.
+DB_ASYNC = os.environ.get("DB_ASYNC", "0") == "1"
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def make_async_engine(url: str = DATABASE_URL, **kwargs):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS and url.drivername == backend:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+    if backend == "sqlite":
+        connect_args = kwargs.pop("connect_args", {})
+        connect_args.setdefault("timeout", SQLITE_PRAGMAS["busy_timeout"] / 1000)
+        kwargs["connect_args"] = connect_args
+        if url.database in (None, "", ":memory:"):
+            kwargs.setdefault("poolclass", StaticPool)
+    if "poolclass" not in kwargs:
+        kwargs.setdefault("pool_size", DB_POOL_SIZE)
+        kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+        kwargs.setdefault("pool_timeout", DB_POOL_TIMEOUT)
+    async_engine = create_async_engine(url, **kwargs)
+    if backend == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return async_engine
+
+def make_async_sessionmaker(async_engine):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    # Objects are serialised after the session work is done, so they must
+    # not expire on commit (no lazy loads outside the session's greenlet)
+    return async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    async_engine = make_async_engine(DATABASE_URL)
+    AsyncSessionLocal = make_async_sessionmaker(async_engine)
+
+# --- Ledgers ---
+# Every ledger is its own SQLite file with the full schema, so writes to
+# different ledgers never wait for each other's lock. The default ledger is
+# DATABASE_URL (the engine above); the others are LEDGER_DIR/<ledger id>.db.
+# Engines are opened on first use and closed again when more than
+# MAX_OPEN_LEDGERS are open, least recently used first.
+DEFAULT_LEDGER = "default"
+LEDGER_DIR = os.environ.get("LEDGER_DIR", "ledgers")
+MAX_OPEN_LEDGERS = int(os.environ.get("MAX_OPEN_LEDGERS", 16))
+LEDGER_ID_PATTERN = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+
+class UnknownLedger(LookupError):
+    pass
+
+class LedgerDatabase:
+    """Engines and session factories of one ledger."""
+    def __init__(self, ledger_id: str, engine, async_engine=None):
+        self.id = ledger_id
+        self.engine = engine
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.async_engine = async_engine
+        self.AsyncSessionLocal = make_async_sessionmaker(async_engine) if async_engine is not None else None
+
+    def dispose(self):
+        self.engine.dispose()
+        if self.async_engine is not None:
+            try:
+                # AsyncEngine.dispose() has to run on the event loop
+                asyncio.get_running_loop().create_task(self.async_engine.dispose())
+            except RuntimeError:
+                pass
+
+class LedgerRouter:
+    """Maps ledger ids to their databases, keeping an LRU of open engines."""
+    def __init__(self, max_open: int = MAX_OPEN_LEDGERS):
+        self.max_open = max_open
+        self._open = OrderedDict()
+        self._initialized = set()
+        self._lock = threading.Lock()
+        self._default = LedgerDatabase(DEFAULT_LEDGER, engine, async_engine)
+
+    def url_for(self, ledger_id: str):
+        if ledger_id == DEFAULT_LEDGER:
+            return DATABASE_URL
+        return f"sqlite:///{os.path.join(LEDGER_DIR, ledger_id + '.db')}"
+
+    def exists(self, ledger_id: str):
+        if ledger_id == DEFAULT_LEDGER:
+            return True
+        return bool(LEDGER_ID_PATTERN.fullmatch(ledger_id)) and os.path.exists(
+            os.path.join(LEDGER_DIR, ledger_id + ".db")
+        )
+
+    def ids(self):
+        """The default ledger plus every ledger file in LEDGER_DIR."""
+        names = os.listdir(LEDGER_DIR) if os.path.isdir(LEDGER_DIR) else []
+        found = sorted(name[:-3] for name in names if name.endswith(".db") and LEDGER_ID_PATTERN.fullmatch(name[:-3]))
+        return [DEFAULT_LEDGER] + [ledger_id for ledger_id in found if ledger_id != DEFAULT_LEDGER]
+
+    def get_open(self, ledger_id: str):
+        """The ledger if it is open already, else None. Never waits for another thread opening one."""
+        if ledger_id == DEFAULT_LEDGER:
+            return self._default
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            ledger = self._open.get(ledger_id)
+            if ledger is not None:
+                self._open.move_to_end(ledger_id)
+            return ledger
+        finally:
+            self._lock.release()
+
+    def migrate_all(self):
+        """Brings the schema of every ledger up to date, without keeping them open."""
+        for ledger_id in self.ids():
+            if ledger_id == DEFAULT_LEDGER:
+                run_migrations(engine)
+                continue
+            ledger_engine = make_engine(self.url_for(ledger_id))
+            try:
+                run_migrations(ledger_engine)
+            finally:
+                ledger_engine.dispose()
+            self._initialized.add(ledger_id)
+
+    def create(self, ledger_id: str):
+        """
+        Creates the file of a new ledger and opens it. Raises FileExistsError
+        when the ledger exists: the file is claimed with O_EXCL, so of two
+        concurrent creates (in any worker) exactly one succeeds.
+        """
+        if not LEDGER_ID_PATTERN.fullmatch(ledger_id):
+            raise UnknownLedger(f"Invalid ledger id: {ledger_id!r}")
+        if ledger_id == DEFAULT_LEDGER:
+            raise FileExistsError(f"Ledger already exists: {ledger_id}")
+        os.makedirs(LEDGER_DIR, exist_ok=True)
+        path = os.path.join(LEDGER_DIR, ledger_id + ".db")
+        # An empty file is an empty SQLite database
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return self.get(ledger_id)
+
+    def get(self, ledger_id: str = DEFAULT_LEDGER):
+        """
+        The ledger's database, opened (and its schema brought up to date) on
+        first use. Raises UnknownLedger for an invalid id or a missing file.
+        """
+        if ledger_id == DEFAULT_LEDGER:
+            return self._default
+        with self._lock:
+            ledger = self._open.get(ledger_id)
+            if ledger is not None:
+                self._open.move_to_end(ledger_id)
+                return ledger
+            if not LEDGER_ID_PATTERN.fullmatch(ledger_id):
+                raise UnknownLedger(f"Invalid ledger id: {ledger_id!r}")
+            if not self.exists(ledger_id):
+                raise UnknownLedger(f"Ledger not found: {ledger_id}")
+            url = self.url_for(ledger_id)
+            ledger = LedgerDatabase(ledger_id, make_engine(url), make_async_engine(url) if DB_ASYNC else None)
+            if ledger_id not in self._initialized:
+                run_migrations(ledger.engine)
+                self._initialized.add(ledger_id)
+            self._open[ledger_id] = ledger
+            while len(self._open) > self.max_open:
+                _, evicted = self._open.popitem(last=False)
+                # Sessions still using it keep working; idle connections close now
+                evicted.dispose()
+            return ledger
+
+ledgers = LedgerRouter()
+
+# Type of the session handed out by session_scope()
+DbSession = Union[Session, "AsyncSession"]
+
+async def open_ledger(ledger_id: str = DEFAULT_LEDGER):
+    """
+    ledgers.get() for the event loop. The first open of a ledger creates its
+    engine and may run its migrations, so it happens on a worker thread.
+    """
+    ledger = ledgers.get_open(ledger_id)
+    if ledger is None:
+        ledger = await anyio.to_thread.run_sync(ledgers.get, ledger_id)
+    return ledger
+
+@asynccontextmanager
+async def session_scope(ledger_id: str = DEFAULT_LEDGER):
+    """AsyncSession in async mode, a regular Session otherwise."""
+    ledger = await open_ledger(ledger_id)
+    if DB_ASYNC:
+        async with ledger.AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = ledger.SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+async def run_crud(db, fn, *args, **kwargs):
+    """
+    Runs a crud.py function without blocking the event loop: on the
+    AsyncSession's greenlet in async mode, on the threadpool otherwise.
+    """
+    if DB_ASYNC:
+        return await db.run_sync(fn, *args, **kwargs)
+    return await anyio.to_thread.run_sync(functools.partial(fn, db, *args, **kwargs))
+
+# --- Migrations ---
+# create_all() only creates missing tables, it never touches tables that
+# already exist. Changes to existing tables go here instead, one function per
+# schema version. The current version is kept in SQLite's `PRAGMA user_version`.
+def _add_missing_columns(conn, table):
+    # Only suitable for nullable columns without server defaults
+    existing = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    for column in table.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+def _create_indexes(conn, table):
+    # Indexes on columns a later migration adds are left to that migration
+    existing = {column['name'] for column in inspect(conn).get_columns(table.name)}
+    for index in table.indexes:
+        if all(column.name in existing for column in index.columns):
+            index.create(bind=conn, checkfirst=True)
+
+def _migration_001_ledger_indexes(conn):
+    for table in (Transaction.__table__, AssetValue.__table__, RecurringTransaction.__table__):
+        _create_indexes(conn, table)
+
+def _migration_002_asset_history_index(conn):
+    _create_indexes(conn, AssetValue.__table__)
+
+def _migration_003_recurring_idempotency_key(conn):
+    _add_missing_columns(conn, Transaction.__table__)
+    _create_indexes(conn, Transaction.__table__)
+
+def _migration_004_populate_rollups(conn):
+    # The (empty) tables were just created by create_all()
+    rebuild_rollup_tables(conn)
+
+def _migration_005_sync_sequence(conn):
+    for table in (Transaction.__table__, AssetValue.__table__, RecurringTransaction.__table__):
+        _add_missing_columns(conn, table)
+        _create_indexes(conn, table)
+        # Existing rows predate the sequence: stamp them 1 so a sync from 0 returns them
+        conn.execute(text(f"UPDATE {table.name} SET updated_seq = 1 WHERE updated_seq IS NULL"))
+    # Continue after the table versions handed out so far, so ETags never repeat
+    conn.execute(text(
+        "INSERT OR IGNORE INTO table_versions (name, version) "
+        "SELECT :name, MAX(COALESCE(MAX(version), 0), 1) FROM table_versions"
+    ), {"name": SYNC_SEQ})
+
+def _migration_006_transactions_fts(conn):
+    for statement in TRANSACTIONS_FTS_DDL:
+        conn.execute(text(statement))
+    # Index the rows that are already there
+    conn.execute(text("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')"))
+
+def _migration_007_recurring_autoincrement(conn):
+    table = RecurringTransaction.__table__
+    sql = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {"name": table.name}).scalar()
+    if 'AUTOINCREMENT' not in sql.upper():
+        # SQLite cannot add AUTOINCREMENT in place: copy into a new table,
+        # drop the old one (with its indexes) and rename the copy
+        rebuilt = table.to_metadata(MetaData(), name=f"{table.name}_rebuilt")
+        conn.execute(CreateTable(rebuilt))
+        columns = ", ".join(column.name for column in table.columns)
+        conn.execute(text(f"INSERT INTO {rebuilt.name} ({columns}) SELECT {columns} FROM {table.name}"))
+        conn.execute(text(f"DROP TABLE {table.name}"))
+        conn.execute(text(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}"))
+        _create_indexes(conn, table)
+    # Ids of items deleted before this migration live on in transactions
+    conn.execute(text(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT :name, 0 "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+    ), {"name": table.name})
+    conn.execute(text(
+        "UPDATE sqlite_sequence SET seq = MAX(seq, "
+        "(SELECT COALESCE(MAX(recurring_id), 0) FROM transactions)) WHERE name = :name"
+    ), {"name": table.name})
+
+def _migration_008_deferrable_fts_insert_trigger(conn):
+    # CREATE TRIGGER IF NOT EXISTS would keep the old definition
+    conn.execute(text("DROP TRIGGER IF EXISTS transactions_fts_insert"))
+    conn.execute(text(TRANSACTIONS_FTS_INSERT_TRIGGER))
+
+MIGRATIONS = [
+    _migration_001_ledger_indexes,
+    _migration_002_asset_history_index,
+    _migration_003_recurring_idempotency_key,
+    _migration_004_populate_rollups,
+    _migration_005_sync_sequence,
+    _migration_006_transactions_fts,
+    _migration_007_recurring_autoincrement,
+    _migration_008_deferrable_fts_insert_trigger,
+]
+
+def get_schema_version(conn):
+    return conn.execute(text("PRAGMA user_version")).scalar()
+
+def run_migrations(bind=engine):
+    """
+    Creates missing tables, then applies the pending migrations, in one
+    transaction that holds SQLite's write lock from the start. Processes
+    starting together (uvicorn --workers N) thus upgrade one at a time: the
+    others wait for the lock (busy_timeout) and then read the new version.
+    """
+    with bind.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            # A deferred BEGIN would only lock at the first write, after
+            # user_version and the existing tables have been read
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        Base.metadata.create_all(bind=conn)
+        version = get_schema_version(conn)
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(conn)
+            # PRAGMA does not accept bound parameters
+            conn.execute(text(f"PRAGMA user_version = {number}"))
+        conn.commit()
+    return len(MIGRATIONS)
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    """Migrates the default ledger and every other ledger in LEDGER_DIR."""
+    ledgers.migrate_all()
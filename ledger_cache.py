@@ -0,0 +1,282 @@
+"""
+Optional in-memory columnar copy of the transactions table.
+
+With LEDGER_CACHE_MB > 0 every API worker keeps the ledger as NumPy arrays
+sorted by date: day numbers, amounts in cents, type and category codes and
+the running balance. crud.py answers the dashboard queries from it with
+searchsorted and vectorized reductions instead of SQL. Before each use the
+cache compares the transactions version with the one it was built at and
+appends the rows written since (updated_seq is above it), so writes from
+other workers and the scheduler show up as well. A ledger larger than the
+budget is not cached and crud.py keeps using SQL.
+"""
+import datetime
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import func, select, cast, Integer
+from sqlalchemy.orm import Session
+
+import database
+import metrics
+from database import Transaction, TableVersion
+
+LEDGER_CACHE_MB = float(os.getenv("LEDGER_CACHE_MB", "0"))
+
+# day int32 + cents int64 + type int16 + category int16 + running balance int64
+BYTES_PER_ROW = 4 + 8 + 2 + 2 + 8
+MAX_CODES = np.iinfo(np.int16).max
+LOAD_CHUNK = 100_000
+EPOCH = datetime.date(1970, 1, 1)
+
+LEDGER_ROWS = metrics.Gauge("ledger_cache_rows", "Transactions held by the in-memory ledger cache.", ("database",))
+
+def _day(value):
+    return (value - EPOCH).days
+
+def _dates(days):
+    return days.astype('datetime64[D]').tolist()
+
+class OverBudget(Exception):
+    pass
+
+# --- Snapshot ---
+class Ledger:
+    """One immutable snapshot of the ledger; refreshes build a new one."""
+    def __init__(self, version: int, reload: int, days, cents, types, categories, running, type_names,
+                 category_names):
+        self.version, self.reload = version, reload
+        self.days, self.cents, self.types, self.categories, self.running = days, cents, types, categories, running
+        self.type_names, self.category_names = type_names, category_names
+
+    def __len__(self):
+        return len(self.days)
+
+    def _slice(self, start=None, end=None):
+        lo = 0 if start is None else int(np.searchsorted(self.days, _day(start), 'left'))
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, _day(end), 'right'))
+        return lo, max(lo, hi)
+
+    def _type_code(self, name):
+        return self.type_names.index(name) if name in self.type_names else -1
+
+    def date_bounds(self):
+        if not len(self):
+            return None, None
+        return tuple(_dates(self.days[[0, -1]]))
+
+    def closing_balance(self):
+        return self.running[-1] / 100 if len(self) else 0.0
+
+    def period_totals(self, start=None, end=None):
+        lo, hi = self._slice(start, end)
+        totals = np.bincount(self.types[lo:hi], weights=self.cents[lo:hi], minlength=len(self.type_names))
+        income = totals[self._type_code('Income')] / 100 if 'Income' in self.type_names else 0.0
+        expenses = totals[self._type_code('Expense')] / 100 if 'Expense' in self.type_names else 0.0
+        return {"income": income, "expenses": expenses, "savings": income - expenses}
+
+    def category_totals(self, start=None, end=None, type: str = 'Expense'):
+        lo, hi = self._slice(start, end)
+        selected = self.types[lo:hi] == self._type_code(type)
+        categories = self.categories[lo:hi][selected]
+        size = len(self.category_names)
+        totals = np.bincount(categories, weights=self.cents[lo:hi][selected], minlength=size)
+        present = np.flatnonzero(np.bincount(categories, minlength=size))
+        rows = [{"category": self.category_names[code], "amount": totals[code] / 100} for code in present.tolist()]
+        return sorted(rows, key=lambda row: row["category"])
+
+    def daily_type_totals(self, start=None, end=None):
+        lo, hi = self._slice(start, end)
+        if lo == hi:
+            return []
+        # Rank the type codes by name, so the groups come out ordered by (day, type)
+        order = np.argsort(np.array(self.type_names, dtype=object)).astype(np.int64)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        keys = (self.days[lo:hi].astype(np.int64) - self.days[lo]) * len(order) + rank[self.types[lo:hi]]
+        groups, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse, weights=self.cents[lo:hi])
+        days = _dates(groups // len(order) + self.days[lo])
+        types = order[groups % len(order)].tolist()
+        return [
+            {"date": day, "type": self.type_names[code], "amount": total / 100}
+            for day, code, total in zip(days, types, totals.tolist())
+        ]
+
+    def daily_balance(self, start=None, end=None):
+        lo, hi = self._slice(start, end)
+        if lo == hi:
+            return []
+        days = self.days[lo:hi]
+        starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) + lo
+        ends = np.r_[starts[1:], hi] - 1
+        # Balance before the first row of each day
+        before = np.where(starts > 0, self.running[np.maximum(starts - 1, 0)], 0)
+        closing = self.running[ends]
+        return [
+            {"date": day, "net_flow": flow / 100, "running_balance": balance / 100}
+            for day, flow, balance in zip(_dates(self.days[starts]), (closing - before).tolist(), closing.tolist())
+        ]
+
+# --- Loading ---
+def _row_query(since: int, until: int):
+    # Day numbers and cents come straight from SQLite, no per-row Python parsing.
+    # The rows of exactly (since, until]: `until` is the version the snapshot
+    # is stamped with, so a write committed after the versions were read is
+    # left to the next append instead of being read twice.
+    return select(
+        cast(func.julianday(Transaction.date) - 2440587.5, Integer),
+        func.coalesce(Transaction.type, ''),
+        func.coalesce(Transaction.category, ''),
+        cast(func.round(func.coalesce(Transaction.amount, 0.0) * 100), Integer),
+    ).where(Transaction.updated_seq > since, Transaction.updated_seq <= until, Transaction.date.isnot(None))
+
+def _encode(names, codes, values):
+    """Codes of `values`, extending the names/codes dictionary with new ones."""
+    out = np.fromiter((codes.setdefault(value, len(codes)) for value in values), np.int32, len(values))
+    names.extend(list(codes)[len(names):])
+    if len(names) > MAX_CODES:
+        raise OverBudget(f"more than {MAX_CODES} distinct types or categories")
+    return out.astype(np.int16)
+
+def _read_rows(db: Session, since: int, until: int, type_names, category_names):
+    """(days, cents, types, categories) of the rows with since < updated_seq <= until, in SQL order."""
+    type_codes = {name: code for code, name in enumerate(type_names)}
+    category_codes = {name: code for code, name in enumerate(category_names)}
+    parts = []
+    result = db.execute(_row_query(since, until).execution_options(yield_per=LOAD_CHUNK))
+    for chunk in result.partitions():
+        days, types, categories, cents = zip(*chunk)
+        parts.append((
+            np.array(days, dtype=np.int32), np.array(cents, dtype=np.int64),
+            _encode(type_names, type_codes, types), _encode(category_names, category_codes, categories),
+        ))
+    if not parts:
+        empty = np.empty(0, dtype=np.int16)
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64), empty, empty
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+def _signed(cents, types, type_names):
+    # Income counts towards the balance, everything else is money going out
+    income = type_names.index('Income') if 'Income' in type_names else -1
+    return np.where(types == income, cents, -cents)
+
+# --- Cache ---
+class LedgerCache:
+    """The cached ledger of one database."""
+    def __init__(self, budget_bytes: int, name: str = ""):
+        self.budget_bytes = budget_bytes
+        self.name = name
+        self._ledger = None
+        # LEDGER_RELOAD version at which the ledger was found to be over budget
+        self._over_budget_at = None
+        self._lock = threading.Lock()
+
+    def _versions(self, db: Session):
+        rows = dict(db.query(TableVersion.name, TableVersion.version).filter(
+            TableVersion.name.in_((Transaction.__tablename__, database.LEDGER_RELOAD))
+        ).all())
+        return rows.get(Transaction.__tablename__, 0), rows.get(database.LEDGER_RELOAD, 0)
+
+    def get(self, db: Session):
+        """The ledger as of `db`'s transaction (or newer), or None to use SQL."""
+        if self.budget_bytes <= 0:
+            return None
+        version, reload = self._versions(db)
+        ledger = self._ledger
+        if ledger is not None and ledger.reload >= reload and ledger.version >= version:
+            return ledger
+        with self._lock:
+            ledger = self._ledger
+            if ledger is not None and ledger.reload >= reload and ledger.version >= version:
+                return ledger
+            if ledger is None or ledger.reload < reload:
+                if self._over_budget_at == reload:
+                    return None
+                ledger = self._load(db, version, reload)
+            else:
+                ledger = self._append(db, ledger, version)
+            self._ledger = ledger
+            LEDGER_ROWS.set(len(ledger) if ledger is not None else 0, database=self.name)
+            return ledger
+
+    def _check_budget(self, rows: int):
+        if rows * BYTES_PER_ROW > self.budget_bytes:
+            raise OverBudget(f"{rows:,} transactions need more than {self.budget_bytes:,} bytes")
+
+    def _load(self, db: Session, version: int, reload: int):
+        try:
+            self._check_budget(db.query(func.count(Transaction.id)).scalar())
+            type_names, category_names = [], []
+            days, cents, types, categories = _read_rows(db, 0, version, type_names, category_names)
+        except OverBudget:
+            self._over_budget_at = reload
+            return None
+        order = np.argsort(days, kind='stable')
+        days, cents, types, categories = days[order], cents[order], types[order], categories[order]
+        running = np.cumsum(_signed(cents, types, type_names))
+        return Ledger(version, reload, days, cents, types, categories, running, type_names, category_names)
+
+    def _append(self, db: Session, ledger: Ledger, version: int):
+        type_names, category_names = list(ledger.type_names), list(ledger.category_names)
+        try:
+            days, cents, types, categories = _read_rows(db, ledger.version, version, type_names, category_names)
+            self._check_budget(len(ledger) + len(days))
+        except OverBudget:
+            self._over_budget_at = ledger.reload
+            return None
+        if not len(days):
+            return Ledger(version, ledger.reload, ledger.days, ledger.cents, ledger.types, ledger.categories,
+                          ledger.running, type_names, category_names)
+        # New rows go after the existing ones of the same day; only the
+        # running balance from the first insertion point on changes
+        order = np.argsort(days, kind='stable')
+        days, cents, types, categories = days[order], cents[order], types[order], categories[order]
+        positions = np.searchsorted(ledger.days, days, 'right')
+        merged = [
+            np.insert(old, positions, new)
+            for old, new in ((ledger.days, days), (ledger.cents, cents), (ledger.types, types),
+                             (ledger.categories, categories))
+        ]
+        first = int(positions[0])
+        signed = _signed(merged[1][first:], merged[2][first:], type_names)
+        opening = ledger.running[first - 1] if first > 0 else 0
+        running = np.concatenate((ledger.running[:first], opening + np.cumsum(signed)))
+        return Ledger(version, ledger.reload, *merged, running, type_names, category_names)
+
+# One cache per ledger database (see database.ledgers), each with the full
+# budget; like the engines, only the most recently used ones are kept
+BUDGET_BYTES = int(LEDGER_CACHE_MB * 2**20)
+_caches = OrderedDict()
+_caches_lock = threading.Lock()
+
+def _cache_for(db: Session):
+    url = db.get_bind().url
+    key = str(url)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = LedgerCache(BUDGET_BYTES, name=os.path.basename(url.database or ""))
+            while len(_caches) > database.MAX_OPEN_LEDGERS:
+                _caches.popitem(last=False)
+        else:
+            _caches.move_to_end(key)
+    return cache
+
+def get(db: Session):
+    """The cached ledger, refreshed up to `db`'s view, or None when the cache is off or over budget."""
+    if BUDGET_BYTES <= 0:
+        return None
+    return _cache_for(db).get(db)
+
+def warm(ledger_id: str = database.DEFAULT_LEDGER):
+    """Loads a ledger ahead of its first request (no-op when the cache is off)."""
+    if BUDGET_BYTES <= 0:
+        return
+    db = database.ledgers.get(ledger_id).SessionLocal()
+    try:
+        get(db)
+    finally:
+        db.close()
@@ -1,19 +1,102 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 import datetime
 import requests
 import time
+import client
 
-# API URL
-API_URL = "http://localhost:8000"
+# pandas, plotly and transforms (which imports pandas) take most of a cold
+# start and Quick Add needs none of them, so the functions and pages that
+# do import them where they are used. Later reruns find them in sys.modules.
 
 # Page Config
 st.set_page_config(page_title="Financial Dashboard", page_icon="💰", layout="wide")
 
+# --- API CACHE ---
+# Every GET of the API carries an ETag built from per-table change counters.
+# A rerun sends one conditional request for /versions (a 304 while nothing
+# changed) and passes the counters to the st.cache_data loaders below, so
+# responses are only fetched and parsed again after a write.
+def fetch_versions():
+    cached = st.session_state.get("api_versions")
+    headers = {"If-None-Match": cached["etag"]} if cached else {}
+    res = client.get("/versions", headers=headers)
+    if res.status_code == 304 and cached:
+        return cached["versions"]
+    res.raise_for_status()
+    st.session_state["api_versions"] = {"etag": res.headers.get("ETag"), "versions": res.json()}
+    return st.session_state["api_versions"]["versions"]
+
+@st.cache_data(max_entries=64)
+def api_get(path, version, params=None):
+    """JSON body and X-Next-Cursor of a GET; `version` only keys the cache."""
+    res = client.get(path, params=params)
+    res.raise_for_status()
+    return res.json(), res.headers.get("X-Next-Cursor")
+
+# Points in the Net Worth chart; the API downsamples longer histories
+CHART_POINTS = 400
+
+@st.cache_data(max_entries=4)
+def load_balance(version):
+    """Downsampled running balance (OHLC per day, week or month)."""
+    import transforms
+    series, _ = api_get("/analytics/balance", version, {"points": CHART_POINTS})
+    return series, transforms.balance_frame(series['points'])
+
+# The period analysis filters these two locally, so picking a new range
+# costs no request. Both are small over the whole history: at most two rows
+# a day, and one per month and expense category.
+@st.cache_data(max_entries=4)
+def load_daily_type_totals(version):
+    """Income/expense per day, requested by column."""
+    import transforms
+    res = client.get("/analytics/daily/types", headers={"Accept": "application/x-columns+json"})
+    res.raise_for_status()
+    return transforms.daily_type_totals_frame(res.json())
+
+@st.cache_data(max_entries=4)
+def load_monthly_expenses(version):
+    """Expenses per month and category, from the monthly rollup."""
+    import transforms
+    rows, _ = api_get("/analytics/monthly", version, {"type": "Expense"})
+    return transforms.monthly_totals_frame(rows)
+
+# --- LOCAL MIRROR ---
+# Full copies of small tables, kept per browser session and brought up to
+# date through GET /sync: after the first load, a rerun only transfers the
+# rows written since the previous one (and nothing at all while the
+# versions are unchanged). Each page mirrors only the tables it shows; the
+# transactions ledger stays on the server and is paged by the API. Rows are
+# requested by column, which pandas takes as is.
+def sync_mirror(tables):
+    """{table name: DataFrame} with every row of `tables`."""
+    import pandas as pd
+    import transforms
+    mirror = st.session_state.setdefault("mirror", {}).setdefault(
+        tuple(tables), {"seq": None, "after_id": None, "tables": {name: pd.DataFrame() for name in tables}}
+    )
+    if mirror["seq"] is not None and max(fetch_versions()[name] for name in tables) <= mirror["seq"]:
+        return mirror["tables"]
+
+    while True:
+        params = {"since": mirror["seq"] or 0, "tables": list(tables)}
+        if mirror["after_id"] is not None:
+            params["after_id"] = mirror["after_id"]
+        res = client.get("/sync", params=params,
+                         headers={"Accept": "application/x-columns+json, application/json;q=0.5"})
+        res.raise_for_status()
+        changes = res.json()
+        for name in tables:
+            mirror["tables"][name] = transforms.merge_changes(
+                mirror["tables"][name], pd.DataFrame(changes[name]), changes["deleted"][name]
+            )
+        mirror["seq"], mirror["after_id"] = changes["seq"], changes["after_id"]
+        if changes["complete"]:
+            return mirror["tables"]
+
 # Sidebar
 st.sidebar.title("Navigation")
-page = st.sidebar.radio("Go to", ["Dashboard", "Quick Add", "Recurring Manager", "Data View"])
+page = st.sidebar.radio("Go to", ["Dashboard", "Quick Add", "Recurring Manager", "Data View"], key="page")
 
 # --- PAGE: QUICK ADD ---
 if page == "Quick Add":
@@ -44,7 +127,7 @@ if page == "Quick Add":
                         "notes": note_inc
                     }
                     try:
-                        res = requests.post(f"{API_URL}/transactions/", json=payload)
+                        res = client.post("/transactions/", json=payload)
                         if res.status_code == 200:
                             st.toast("✅ Income added successfully!", icon='💰')
                             time.sleep(2)
@@ -75,7 +158,7 @@ if page == "Quick Add":
                         "notes": note_exp
                     }
                     try:
-                        res = requests.post(f"{API_URL}/transactions/", json=payload)
+                        res = client.post("/transactions/", json=payload)
                         if res.status_code == 200:
                             st.toast("✅ Expense added successfully!", icon='💸')
                             time.sleep(2)
@@ -111,7 +194,7 @@ if page == "Quick Add":
                     "amount": a_amount
                 }
                 try:
-                    res = requests.post(f"{API_URL}/assets/", json=payload)
+                    res = client.post("/assets/", json=payload)
                     if res.status_code == 200:
                         st.success("Asset updated!")
                     else:
@@ -146,7 +229,7 @@ elif page == "Recurring Manager":
                         "start_date": str(r_start_inc), "is_active": True
                     }
                     try:
-                        res = requests.post(f"{API_URL}/recurring/", json=payload)
+                        res = client.post("/recurring/", json=payload)
                         if res.status_code == 200:
                             st.toast("✅ Recurring Income set successfully!", icon='💰')
                             time.sleep(2)
@@ -175,7 +258,7 @@ elif page == "Recurring Manager":
                         "start_date": str(r_start_exp), "is_active": True
                     }
                     try:
-                        res = requests.post(f"{API_URL}/recurring/", json=payload)
+                        res = client.post("/recurring/", json=payload)
                         if res.status_code == 200:
                             st.toast("✅ Recurring Expense set successfully!", icon='💸')
                             time.sleep(2)
@@ -210,7 +293,7 @@ elif page == "Recurring Manager":
             except: start_dt = datetime.date.today()
             e_start = st.date_input("Start Date", value=start_dt)
             
-            e_active = st.checkbox("Active", value=item['is_active'])
+            e_active = st.checkbox("Active", value=bool(item['is_active']))
             
             if st.form_submit_button("Save Changes"):
                 payload = {
@@ -221,7 +304,7 @@ elif page == "Recurring Manager":
                 
                 success = False
                 try:
-                    res = requests.put(f"{API_URL}/recurring/{item['id']}", json=payload)
+                    res = client.put(f"/recurring/{item['id']}", json=payload)
                     if res.status_code == 200:
                         success = True
                     else: st.error(f"Update failed: {res.text}")
@@ -233,139 +316,186 @@ elif page == "Recurring Manager":
 
     # Fetch data
     try:
-        res = requests.get(f"{API_URL}/recurring/")
-        if res.status_code == 200:
-            rec_items = res.json()
-            if rec_items:
-                # Header
-                h1, h2, h3, h4, h5, h6 = st.columns([2, 1, 1, 1, 1, 1])
-                h1.markdown("**Name**")
-                h2.markdown("**Amount**")
-                h3.markdown("**Type**")
-                h4.markdown("**Freq**")
-                h5.markdown("**Active?**")
-                h6.markdown("**Actions**")
+        recurring_df = sync_mirror(["recurring_transactions"])["recurring_transactions"]
+        rec_items = recurring_df.sort_values('id').astype(object).to_dict('records') if not recurring_df.empty else []
+        if rec_items:
+            # Header
+            h1, h2, h3, h4, h5, h6 = st.columns([2, 1, 1, 1, 1, 1])
+            h1.markdown("**Name**")
+            h2.markdown("**Amount**")
+            h3.markdown("**Type**")
+            h4.markdown("**Freq**")
+            h5.markdown("**Active?**")
+            h6.markdown("**Actions**")
+            st.divider()
+
+            for item in rec_items:
+                c1, c2, c3, c4, c5, c6 = st.columns([2, 1, 1, 1, 1, 1])
+                c1.write(item['name'])
+                c2.write(f"${item['amount']:.2f}")
+                c3.write(item['type'])
+                c4.write(item['frequency'])
+                c5.write("✅" if item['is_active'] else "⏸️")
+
+                with c6:
+                    ec1, ec2 = st.columns(2)
+                    if ec1.button("✏️", key=f"edit_{item['id']}", help="Edit"):
+                        edit_recurring_dialog(item)
+
+                    if ec2.button("🗑️", key=f"del_{item['id']}", help="Delete"):
+                        del_success = False
+                        try:
+                            d_res = client.delete(f"/recurring/{item['id']}")
+                            if d_res.status_code == 200:
+                                del_success = True
+                            else: st.error("Delete failed")
+                        except requests.exceptions.RequestException: st.error("API Error")
+
+                        if del_success:
+                            st.toast("🗑️ Item deleted")
+                            st.rerun()
                 st.divider()
-                
-                for item in rec_items:
-                    c1, c2, c3, c4, c5, c6 = st.columns([2, 1, 1, 1, 1, 1])
-                    c1.write(item['name'])
-                    c2.write(f"${item['amount']:.2f}")
-                    c3.write(item['type'])
-                    c4.write(item['frequency'])
-                    c5.write("✅" if item['is_active'] else "⏸️")
-                    
-                    with c6:
-                        ec1, ec2 = st.columns(2)
-                        if ec1.button("✏️", key=f"edit_{item['id']}", help="Edit"):
-                            edit_recurring_dialog(item)
-                        
-                        if ec2.button("🗑️", key=f"del_{item['id']}", help="Delete"):
-                            del_success = False
-                            try:
-                                d_res = requests.delete(f"{API_URL}/recurring/{item['id']}")
-                                if d_res.status_code == 200:
-                                    del_success = True
-                                else: st.error("Delete failed")
-                            except requests.exceptions.RequestException: st.error("API Error")
-                            
-                            if del_success:
-                                st.toast("🗑️ Item deleted")
-                                st.rerun()
-                    st.divider()
 
-            else:
-                st.info("No recurring items found.")
         else:
-            st.error("Failed to fetch items.")
+            st.info("No recurring items found.")
 
+    except requests.exceptions.HTTPError:
+        st.error("Failed to fetch items.")
     except requests.exceptions.RequestException:
         st.error("Connection Error: Could not reach API")
 
 
 # --- PAGE: DATA VIEW ---
 elif page == "Data View":
+    import pandas as pd
+
     st.header("📄 Data Viewer")
     
     tab1, tab2 = st.tabs(["Transactions", "Asset History"])
-    
-    with tab1:
+
+    # Filters are applied by the API; pages are fetched with the cursor
+    # returned in the X-Next-Cursor header, newest first.
+    def paged_table(key, path, table, params, empty_msg):
+        # Start over from the first page whenever the filters change
+        filter_key = tuple(sorted(params.items()))
+        if st.session_state.get(f"{key}_filter_key") != filter_key:
+            st.session_state[f"{key}_filter_key"] = filter_key
+            st.session_state[f"{key}_cursors"] = [None]
+        cursors = st.session_state[f"{key}_cursors"]
+
         try:
-            response = requests.get(f"{API_URL}/transactions/")
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    df = pd.DataFrame(data)
-                    st.dataframe(df.sort_values(by="date", ascending=False), use_container_width=True)
-                else:
-                    st.info("No transactions found.")
+            if cursors[-1]:
+                params = {**params, "cursor": cursors[-1]}
+            # Cached per page until `table` changes
+            data, next_cursor = api_get(path, fetch_versions()[table], params)
+            if data:
+                df = pd.DataFrame(data)
+                st.dataframe(df, use_container_width=True)
+            else:
+                st.info(empty_msg)
+
+            n1, n2, n3 = st.columns([1, 2, 1])
+            n2.caption(f"Page {len(cursors)}")
+            if n1.button("⬅️ Previous", disabled=len(cursors) == 1, key=f"{key}_prev"):
+                cursors.pop()
+                st.rerun()
+            if n3.button("Next ➡️", disabled=not next_cursor, key=f"{key}_next"):
+                cursors.append(next_cursor)
+                st.rerun()
+        except requests.exceptions.HTTPError as e:
+            st.error(f"Error: {e.response.status_code}")
         except:
             st.error("API Error")
 
+    with tab1:
+        f1, f2, f3, f4, f5 = st.columns([1, 1, 1, 1, 1])
+        with f1:
+            f_start = st.date_input("From", value=None, key="dv_start")
+        with f2:
+            f_end = st.date_input("To", value=None, key="dv_end")
+        with f3:
+            f_type = st.selectbox("Type", ["All", "Income", "Expense"], key="dv_type")
+        with f4:
+            f_cat = st.text_input("Category", key="dv_cat")
+        with f5:
+            page_size = st.selectbox("Rows per page", [100, 500, 1000, 5000], index=2, key="dv_page_size")
+
+        params = {"limit": page_size, "order": "desc"}
+        if f_start: params["start"] = str(f_start)
+        if f_end: params["end"] = str(f_end)
+        if f_type != "All": params["type"] = f_type
+        if f_cat: params["category"] = f_cat
+
+        paged_table("dv", "/transactions/", "transactions", params, "No transactions found.")
+
     with tab2:
-        try:
-            response = requests.get(f"{API_URL}/assets/")
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    df = pd.DataFrame(data)
-                    st.dataframe(df.sort_values(by="date", ascending=False), use_container_width=True)
-                else:
-                    st.info("No asset history found.")
-        except:
-            st.error("API Error")
+        g1, g2, g3 = st.columns([1, 2, 1])
+        with g1:
+            h_type = st.selectbox("Type", ["All", "Cash", "Credit Card Debt", "Investment", "Property"], key="ah_type")
+        with g2:
+            h_name = st.text_input("Name", key="ah_name")
+        with g3:
+            h_page_size = st.selectbox("Rows per page", [100, 500, 1000, 5000], index=2, key="ah_page_size")
+
+        params = {"limit": h_page_size, "order": "desc"}
+        if h_type != "All": params["type"] = h_type
+        if h_name: params["name"] = h_name
+
+        paged_table("ah", "/assets/history", "asset_values", params, "No asset history found.")
 
 # --- PAGE: DASHBOARD ---
 elif page == "Dashboard":
+    import plotly.express as px
+    import plotly.graph_objects as go
+    import transforms
+
     st.header("📊 Financial Overview")
     
     # 1. FETCH DATA
     try:
-        t_res = requests.get(f"{API_URL}/transactions/")
-        a_res = requests.get(f"{API_URL}/assets/")
-        
-        transactions = t_res.json() if t_res.status_code == 200 else []
-        assets = a_res.json() if a_res.status_code == 200 else []
+        versions = fetch_versions()
+        # Independent requests, fetched concurrently
+        (balance, balance_df), (snapshot, _), daily_totals, monthly_expenses = client.gather(
+            lambda: load_balance(versions['transactions']),
+            lambda: api_get("/assets/", versions['asset_values']),
+            lambda: load_daily_type_totals(versions['transactions']),
+            lambda: load_monthly_expenses(versions['transactions']),
+        )
         
-        # 2. PROCESS ASSET DATA (Net Worth Snapshot)
-        latest_values = {}
-        if assets:
-            df_assets = pd.DataFrame(assets)
-            df_assets['date'] = pd.to_datetime(df_assets['date'])
-            # Sort by date and get last entry for each (type, name)
-            df_assets = df_assets.sort_values('date')
-            latest_values_df = df_assets.groupby(['type', 'name']).last().reset_index()
-            
-            # Calculate Totals
-            total_cash = latest_values_df[latest_values_df['type'] == 'Cash']['amount'].sum()
-            total_debt = latest_values_df[latest_values_df['type'] == 'Credit Card Debt']['amount'].sum()
-            total_inv = latest_values_df[latest_values_df['type'] == 'Investment']['amount'].sum()
-            total_prop = latest_values_df[latest_values_df['type'] == 'Property']['amount'].sum()
-            
-            net_worth_assets = (total_cash + total_inv + total_prop) - total_debt
-        else:
-            total_cash = total_debt = total_inv = total_prop = net_worth_assets = 0.0
+        # 2. ASSET DATA (Net Worth Snapshot)
+        # Latest value per account and the totals per type come from the API
+        totals = snapshot['totals'] if snapshot else {}
+        total_cash = totals.get('Cash', 0.0)
+        total_debt = totals.get('Credit Card Debt', 0.0)
+        total_inv = totals.get('Investment', 0.0)
+        total_prop = totals.get('Property', 0.0)
+        net_worth_assets = snapshot['net_worth'] if snapshot else 0.0
 
         # 3. DISPLAY TRANSACTION-BASED NET WORTH GRAPH (Cash Flow)
-        if transactions:
-            df = pd.DataFrame(transactions)
-            df['date'] = pd.to_datetime(df['date'])
-            
-            # Create a signed amount column: Income is positive, Expense is negative
-            df['signed_amount'] = df.apply(lambda x: x['amount'] if x['type'] == 'Income' else -x['amount'], axis=1)
-            
-            # Group by date for the graph
-            daily_df = df.groupby('date')['signed_amount'].sum().reset_index()
-            daily_df = daily_df.sort_values('date')
-            daily_df['running_balance'] = daily_df['signed_amount'].cumsum()
-            
-            current_run_bal = daily_df['running_balance'].iloc[-1]
-            
+        # The API aggregates the running balance per day, week or month
+        # (whatever keeps it under CHART_POINTS); the band shows each
+        # bucket's low/high, the line its closing balance
+        has_transactions = not balance_df.empty
+        if has_transactions:
             st.subheader("📈 Net Worth (Cumulative Cash Flow)")
-            fig_net_worth = px.line(daily_df, x='date', y='running_balance', markers=True, 
-                                    labels={'running_balance': 'Cumulative Balance ($)', 'date': 'Date'})
-            fig_net_worth.update_traces(line_color='#2ca02c') # Green line
-            fig_net_worth.update_xaxes(tickformat="%Y-%m-%d", dtick="D1")
+            fig_net_worth = go.Figure([
+                go.Scatter(x=balance_df['date'], y=balance_df['high'], line_width=0, hoverinfo='skip',
+                           showlegend=False),
+                go.Scatter(x=balance_df['date'], y=balance_df['low'], line_width=0, fill='tonexty',
+                           fillcolor='rgba(44, 160, 44, 0.2)', hoverinfo='skip', showlegend=False),
+                go.Scatter(x=balance_df['date'], y=balance_df['close'], name='Balance',
+                           mode='lines+markers' if len(balance_df) <= 60 else 'lines',
+                           line_color='#2ca02c'), # Green line
+            ])
+            fig_net_worth.update_layout(xaxis_title='Date', yaxis_title='Cumulative Balance ($)',
+                                        hovermode='x unified')
+            # Let Plotly space the ticks and pick the label format per zoom level
+            fig_net_worth.update_xaxes(tickformatstops=[
+                dict(dtickrange=[None, 86400000 * 7], value="%Y-%m-%d"),
+                dict(dtickrange=[86400000 * 7, "M12"], value="%b %Y"),
+                dict(dtickrange=["M12", None], value="%Y"),
+            ])
+            st.caption(f"Per {balance['resolution']}")
             
             st.plotly_chart(fig_net_worth, use_container_width=True)
             
@@ -390,23 +520,27 @@ elif page == "Dashboard":
         st.divider()
 
         # 5. PERIOD ANALYSIS (Bottom Section)
-        if transactions:
+        if has_transactions:
             st.subheader("📅 Monthly Income & Expenses Analysis")
             
+            # From the same month last year by default. Filtered locally from
+            # the cached totals: changing the range needs no request
+            today = datetime.date.today()
+            year_ago = today.replace(year=today.year - 1, day=1)
             c1, c2 = st.columns(2)
             with c1:
-                start_date = st.date_input("Start Date", df['date'].min())
+                start_date = st.date_input("Start Date",
+                                           max(year_ago, datetime.date.fromisoformat(balance['first_date'])))
             with c2:
-                end_date = st.date_input("End Date", datetime.date.today())
+                end_date = st.date_input("End Date", today)
 
-            mask = (df['date'].dt.date >= start_date) & (df['date'].dt.date <= end_date)
-            filtered_df = df.loc[mask]
+            period = transforms.period_analysis(daily_totals, monthly_expenses, start_date, end_date)
 
-            if not filtered_df.empty:
+            if period:
                 # KPIS
-                inc = filtered_df[filtered_df['type'] == 'Income']['amount'].sum()
-                exp = filtered_df[filtered_df['type'] == 'Expense']['amount'].sum()
-                sav = inc - exp
+                inc = period['income']
+                exp = period['expenses']
+                sav = period['savings']
                 
                 k1, k2, k3 = st.columns(3)
                 k1.metric("Income", f"${inc:,.2f}")
@@ -416,13 +550,15 @@ elif page == "Dashboard":
                 # Charts
                 ch1, ch2 = st.columns(2)
                 with ch1:
-                    exp_df = filtered_df[filtered_df['type'] == 'Expense']
+                    exp_df = period['expense_categories']
                     if not exp_df.empty:
                         fig = px.pie(exp_df, values='amount', names='category', hole=0.4, title="Expenses by Category")
                         st.plotly_chart(fig, use_container_width=True)
+                        first_month, last_month = period['category_months']
+                        st.caption(f"Whole months, {first_month:%b %Y} to {last_month:%b %Y}")
                 with ch2:
                     # Daily Trend
-                    trend = filtered_df.groupby([filtered_df['date'].dt.date, 'type'])['amount'].sum().reset_index()
+                    trend = period['daily_trend']
                     if not trend.empty:
                         fig = px.bar(trend, x='date', y='amount', color='type', title="Daily Trend",
                                      color_discrete_map={'Income': 'green', 'Expense': 'red'})
@@ -0,0 +1,36 @@
+"""
+Maintenance commands for the ledger database.
+
+    python manage.py rebuild-rollups
+    python manage.py rebuild-rollups --ledger household
+"""
+import argparse
+import database
+import crud
+
+def rebuild_rollups(args):
+    db = database.ledgers.get(args.ledger).SessionLocal()
+    try:
+        crud.rebuild_rollups(db)
+    finally:
+        db.close()
+    print(f"Rollup tables rebuilt (ledger {args.ledger}).")
+
+COMMANDS = {
+    "rebuild-rollups": rebuild_rollups,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Ledger maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--ledger", default=database.DEFAULT_LEDGER,
+                        help=f"ledger id (default: {database.DEFAULT_LEDGER}), see GET /ledgers")
+    args = parser.parse_args()
+    database.init_db()
+    try:
+        COMMANDS[args.command](args)
+    except database.UnknownLedger as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    main()
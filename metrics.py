@@ -0,0 +1,205 @@
+"""
+In-process metrics in the Prometheus text format.
+
+MetricsMiddleware times every request per route template and status;
+instrument_engine() hooks SQLAlchemy's cursor events to count and time
+every statement, both in total and per request (so a route that issues one
+query per row stands out). The scheduler reports its runs through the
+SCHEDULER_* metrics. api.py serves render() on GET /metrics.
+
+Values are per process: with uvicorn --workers N, every worker exposes
+its own.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+# Statements slower than this are logged (0 = off)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+logger = logging.getLogger("financial_dashboard.sql")
+
+# --- Metric types ---
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [per-bucket counts..., +Inf count, sum]
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            state[bisect.bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+
+    def _render_sample(self, key, state):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _format_value(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', le)])} {cumulative}")
+        labels = _format_labels(self.labels, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+REGISTRY = []
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# --- Metrics ---
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency until the last body byte.",
+                         ("method", "route"))
+HTTP_DB_STATEMENTS = Histogram("http_request_db_statements", "SQL statements issued per HTTP request.",
+                               ("method", "route"), buckets=COUNT_BUCKETS)
+HTTP_DB_SECONDS = Histogram("http_request_db_seconds", "Time spent in SQL statements per HTTP request.",
+                            ("method", "route"))
+DB_STATEMENTS = Counter("db_statements_total", "SQL statements by operation.", ("operation",))
+DB_SECONDS = Histogram("db_statement_duration_seconds", "SQL statement latency by operation.", ("operation",))
+DB_SLOW_STATEMENTS = Counter("db_slow_statements_total", "SQL statements slower than SLOW_QUERY_MS.")
+SCHEDULER_RUNS = Counter("scheduler_runs_total", "Recurring processing runs by outcome (ok, deferred, error).",
+                         ("ledger", "outcome"))
+SCHEDULER_SECONDS = Histogram("scheduler_run_duration_seconds", "Duration of recurring processing runs.",
+                              ("ledger",))
+SCHEDULER_ROWS = Counter("scheduler_generated_transactions_total",
+                         "Transactions generated from recurring items.", ("ledger",))
+SCHEDULER_LAST_SUCCESS = Gauge("scheduler_last_success_timestamp_seconds",
+                               "Unix time of the last successful recurring processing run.", ("ledger",))
+
+# --- Per-request SQL stats ---
+class RequestStats:
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+# Threadpool and run_sync() calls copy the context, so they share the object
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+# The start time lives on the statement's execution context, so a statement
+# that raises (and never reaches after_cursor_execute) leaves nothing behind
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    DB_STATEMENTS.inc(operation=operation)
+    DB_SECONDS.observe(elapsed, operation=operation)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.seconds += elapsed
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        DB_SLOW_STATEMENTS.inc()
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split()))
+
+def instrument_engine(engine):
+    """
+    Counts and times every statement of a (sync) engine; pass
+    async_engine.sync_engine for async ones, or the Engine class for all.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+# --- Middleware ---
+class MetricsMiddleware:
+    """ASGI middleware recording HTTP_* metrics. Routes are labelled by their template."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method=method, route=route, status=status)
+            HTTP_SECONDS.observe(time.perf_counter() - started, method=method, route=route)
+            HTTP_DB_STATEMENTS.observe(stats.statements, method=method, route=route)
+            HTTP_DB_SECONDS.observe(stats.seconds, method=method, route=route)
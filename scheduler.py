@@ -0,0 +1,138 @@
+"""
+Due-date-driven runner for recurring transactions.
+
+Keeps the next_run_date of every active RecurringTransaction in a min-heap
+and sleeps until the earliest one is due, instead of polling the database.
+The API calls schedule()/unschedule() whenever a recurring item changes so
+the sleep is cut short when an earlier date shows up. Runs as an asyncio
+task on the API's event loop.
+"""
+import asyncio
+import datetime
+import heapq
+
+# Upper bound for a single sleep. Waking up costs no queries, it only guards
+# against wall-clock jumps (suspend/resume, manual clock changes).
+MAX_SLEEP_SECONDS = 3600
+# Wait before retrying after the job raised
+RETRY_SECONDS = 60
+# Wait before retrying when another worker is running the job
+DEFERRED_RETRY_SECONDS = 5
+
+class JobDeferred(Exception):
+    """Raised by a job that cannot run right now, e.g. another worker holds its lease."""
+
+class RecurringScheduler:
+    def __init__(self, job, load_schedule, name: str = "recurring-scheduler"):
+        """
+        job: coroutine function running the recurring processor.
+        load_schedule: coroutine function returning (recurring_id,
+        next_run_date) pairs for all active items.
+        name: name of the asyncio task.
+        """
+        self.name = name
+        self._job = job
+        self._load_schedule = load_schedule
+        self._heap = []  # (next_run_date, recurring_id), may hold stale entries
+        self._due = {}  # recurring_id -> next_run_date, the source of truth
+        self._retry_at = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    # --- Schedule changes ---
+    # Called from the event loop (the API's async endpoints)
+    def schedule(self, recurring_id: int, next_run_date: datetime.date):
+        self._push(recurring_id, next_run_date)
+        self._wakeup.set()
+
+    def unschedule(self, recurring_id: int):
+        # The heap entry goes stale and is dropped when it reaches the top
+        self._due.pop(recurring_id, None)
+        self._wakeup.set()
+
+    async def reload(self, defer_ids=(), not_before: datetime.date = None):
+        """
+        Rebuilds the heap from the database (one query). Items in `defer_ids`
+        that are still due (the job could not advance them, e.g. an unknown
+        frequency) are pushed to `not_before` so they don't spin.
+        """
+        schedule = await self._load_schedule()
+        self._heap = []
+        self._due = {}
+        for recurring_id, next_run_date in schedule:
+            if recurring_id in defer_ids and next_run_date < not_before:
+                next_run_date = not_before
+            self._push(recurring_id, next_run_date)
+        self._wakeup.set()
+
+    def next_due(self):
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _push(self, recurring_id, next_run_date):
+        self._due[recurring_id] = next_run_date
+        heapq.heappush(self._heap, (next_run_date, recurring_id))
+
+    def _drop_stale(self):
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    # --- Runner ---
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Loads the schedule and starts the runner; a no-op while it is running."""
+        if self.running():
+            return
+        await self.reload()
+        # Another start() may have got here while this one was loading
+        if not self.running():
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _seconds_until_due(self, now: datetime.datetime):
+        # An item is due from local midnight of its next_run_date
+        due_at = datetime.datetime.combine(self._heap[0][0], datetime.time.min)
+        if self._retry_at is not None:
+            due_at = max(due_at, self._retry_at)
+        return (due_at - now).total_seconds()
+
+    async def _wait_until_due(self):
+        """Sleeps until the earliest item is due, waking early on schedule changes."""
+        while True:
+            self._wakeup.clear()
+            self._drop_stale()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            wait = self._seconds_until_due(datetime.datetime.now())
+            if wait <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(wait, MAX_SLEEP_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self):
+        while True:
+            await self._wait_until_due()
+            today = datetime.date.today()
+            attempted = {rid for rid, day in self._due.items() if day <= today}
+            try:
+                await self._job()
+                self._retry_at = None
+                await self.reload(defer_ids=attempted, not_before=today + datetime.timedelta(days=1))
+            except JobDeferred:
+                self._retry_at = datetime.datetime.now() + datetime.timedelta(seconds=DEFERRED_RETRY_SECONDS)
+            except Exception as e:
+                print(f"Scheduler Error: {e}")
+                self._retry_at = datetime.datetime.now() + datetime.timedelta(seconds=RETRY_SECONDS)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date
-from typing import Optional
+from typing import Optional, List, Dict
 
 # --- Transaction Schemas ---
 class TransactionBase(BaseModel):
@@ -15,10 +15,20 @@ class TransactionCreate(TransactionBase):
 
 class Transaction(TransactionBase):
     id: int
+    recurring_id: Optional[int] = None  # Set when generated from a recurring item
 
     class Config:
         from_attributes = True
 
+class BulkRowError(BaseModel):
+    row: int  # 1-based data row (CSV header and blank lines not counted)
+    error: str
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkRowError]  # Capped, see bulk.MAX_REPORTED_ERRORS
+
 # --- Asset Schemas ---
 class AssetBase(BaseModel):
     date: date
@@ -35,6 +45,14 @@ class Asset(AssetBase):
     class Config:
         from_attributes = True
 
+class AssetSnapshot(BaseModel):
+    assets: List[Asset]  # Latest value per (type, name)
+    totals: Dict[str, float]  # Sum of latest values per type
+    net_worth: float
+
+    class Config:
+        from_attributes = True
+
 # --- Recurring Schemas ---
 class RecurringBase(BaseModel):
     name: str
@@ -62,4 +80,97 @@ class Recurring(RecurringBase):
     next_run_date: date
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- Sync Schemas ---
+class SyncChanges(BaseModel):
+    seq: int # Pass as `since` on the next sync
+    after_id: Optional[int] = None # Pass as `after_id` on the next sync (set while incomplete)
+    complete: bool # False: more changes are waiting, sync again right away
+    transactions: List[Transaction]
+    asset_values: List[Asset]
+    recurring_transactions: List[Recurring]
+    deleted: Dict[str, List[int]] # Table name -> deleted ids
+
+# --- Dashboard Schemas ---
+class DailyBalance(BaseModel):
+    date: date
+    net_flow: float
+    running_balance: float
+
+class BalanceBucket(BaseModel):
+    date: date # First day of the bucket
+    open: float
+    high: float
+    low: float
+    close: float
+    net_flow: float
+
+class BalanceSeries(BaseModel):
+    first_date: Optional[date] = None
+    last_date: Optional[date] = None
+    resolution: str # 'day', 'week' or 'month'
+    method: str # 'ohlc' or 'lttb'
+    points: List[BalanceBucket]
+
+class ForecastPoint(BaseModel):
+    date: date # The day, or the first day of the month
+    net_flow: float
+    balance: float # At the end of the day/month
+
+class Forecast(BaseModel):
+    start: date
+    end: date
+    resolution: str # 'day' or 'month'
+    opening_balance: float
+    points: List[ForecastPoint]
+
+class CategoryTotal(BaseModel):
+    category: Optional[str] = None
+    amount: float
+
+class DailyTypeTotal(BaseModel):
+    date: date
+    type: str
+    amount: float
+
+class PeriodTotals(BaseModel):
+    income: float
+    expenses: float
+    savings: float
+
+class DashboardSummary(BaseModel):
+    first_date: Optional[date] = None
+    last_date: Optional[date] = None
+    totals: PeriodTotals
+    balance: List[DailyBalance]
+    expense_categories: List[CategoryTotal]
+    daily_trend: List[DailyTypeTotal]
+
+# --- Analytics Schemas ---
+class MonthlyTotal(BaseModel):
+    month: date  # First day of the month
+    type: str
+    category: str
+    total: float
+    count: int
+
+    class Config:
+        from_attributes = True
+
+class DailyTotal(BaseModel):
+    day: date
+    type: str
+    category: str
+    total: float
+    count: int
+
+    class Config:
+        from_attributes = True
+
+# --- Ledger Schemas ---
+class LedgerCreate(BaseModel):
+    id: str = Field(..., pattern=r"^[a-z0-9][a-z0-9_-]{0,63}$")  # Also the database file name
+
+class Ledger(BaseModel):
+    id: str
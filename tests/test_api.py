@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+import pytest
+
+import api
+import database
+
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    database.run_migrations(engine)
+    ledger = database.LedgerDatabase(database.DEFAULT_LEDGER, engine)
+    monkeypatch.setattr(database.ledgers, "_default", ledger)
+    # No `with`: the lifespan (startup, scheduler) stays off
+    return TestClient(api.app)
+
+
+def test_offset_paging_honours_order(client):
+    for day in ("2024-01-01", "2024-01-02", "2024-01-03"):
+        client.post("/transactions/", json={"date": day, "type": "Expense", "category": "Food", "amount": 1})
+
+    ascending = client.get("/transactions/", params={"skip": 1, "limit": 5}).json()
+    descending = client.get("/transactions/", params={"skip": 1, "limit": 5, "order": "desc"}).json()
+
+    assert [row["date"] for row in ascending] == ["2024-01-02", "2024-01-03"]
+    assert [row["date"] for row in descending] == ["2024-01-02", "2024-01-01"]
+
+
+def test_negative_skip_is_rejected(client):
+    assert client.get("/transactions/", params={"skip": -1}).status_code == 422
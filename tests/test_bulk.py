@@ -0,0 +1,49 @@
+import bulk
+import crud
+import schemas
+from database import FtsDeferred, Transaction
+
+CSV_HEADER = b"date,type,category,amount,notes\n"
+
+
+def test_undecodable_row_stops_the_import_and_is_reported(db):
+    upload = CSV_HEADER + b"2024-01-01,Expense,Food,4.5,bread\n" + b"2024-01-02,Expense,Food,3.2,caf\xe9\n" \
+        + b"2024-01-03,Expense,Food,9.9,rice\n"
+    # Split inside the bad row, as a streamed upload may be
+    chunks = [upload[:50], upload[50:]]
+
+    result = bulk.import_transactions(db, chunks, 'csv')
+
+    assert result["inserted"] == 1
+    assert result["failed"] == 1
+    assert result["errors"][0]["row"] == 2
+    assert "can't decode byte 0xe9" in result["errors"][0]["error"]
+    assert db.query(Transaction).count() == 1
+
+
+def test_undecodable_ndjson_line_is_reported_by_row(db):
+    chunks = [b'{"date": "2024-01-01", "type": "Expense", "category": "Food", "amount": 1, "notes": ""}\n', b'{"notes": "caf\xe9"}\n']
+
+    result = bulk.import_transactions(db, chunks, 'ndjson')
+
+    assert (result["inserted"], result["failed"], result["errors"][0]["row"]) == (1, 1, 2)
+
+
+def test_csv_error_is_reported(db):
+    # A field over csv.field_size_limit()
+    chunks = [CSV_HEADER + b"2024-01-01,Expense,Food,4.5,bread\n2024-01-02,Expense,Food,1," + b"x" * 200_000 + b"\n"]
+
+    result = bulk.import_transactions(db, chunks, 'csv')
+
+    assert (result["inserted"], result["failed"], result["errors"][0]["row"]) == (1, 1, 2)
+
+
+def test_single_inserts_are_indexed_again_after_a_bulk_import(db):
+    chunks = [CSV_HEADER + b"2024-01-01,Expense,Food,4.5,bread\n2024-01-02,Expense,Food,3.2,bread rolls\n"]
+    assert bulk.import_transactions(db, chunks, 'csv', chunk_size=1)["inserted"] == 2
+    crud.create_transaction(db, schemas.TransactionCreate(date="2024-01-03", type="Expense", category="Food",
+                                                          amount=2.0, notes="bread"))
+
+    rows, _ = crud.search_transactions(db, "bread")
+    assert sorted(row.id for row in rows) == [1, 2, 3]
+    assert db.query(FtsDeferred).count() == 0
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+from sqlalchemy import create_engine, text
+
+import database
+from scheduler import RecurringScheduler
+from test_migrations import BASELINE_SCHEMA
+
+
+def _schema_version(path):
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        with engine.connect() as conn:
+            return database.get_schema_version(conn)
+    finally:
+        engine.dispose()
+
+
+def _baseline_ledger(path):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+    engine.dispose()
+
+
+def test_init_db_migrates_every_ledger(tmp_path, engine, monkeypatch):
+    ledger_dir = tmp_path / "ledgers"
+    ledger_dir.mkdir()
+    _baseline_ledger(ledger_dir / "household.db")
+    monkeypatch.setattr(database, "LEDGER_DIR", str(ledger_dir))
+    monkeypatch.setattr(database, "engine", engine)
+
+    database.init_db()
+
+    assert _schema_version(tmp_path / "ledger.db") == len(database.MIGRATIONS)
+    assert _schema_version(ledger_dir / "household.db") == len(database.MIGRATIONS)
+
+
+def test_session_scope_opens_ledgers_off_the_event_loop(tmp_path, monkeypatch):
+    ledger_dir = tmp_path / "ledgers"
+    ledger_dir.mkdir()
+    _baseline_ledger(ledger_dir / "household.db")
+    monkeypatch.setattr(database, "LEDGER_DIR", str(ledger_dir))
+    monkeypatch.setattr(database, "ledgers", database.LedgerRouter())
+    migrated_on = []
+    run_migrations = database.run_migrations
+    monkeypatch.setattr(database, "run_migrations",
+                        lambda bind: migrated_on.append(threading.get_ident()) or run_migrations(bind))
+
+    async def open_twice():
+        for _ in range(2):
+            async with database.session_scope("household") as db:
+                db.execute(text("SELECT 1"))
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(open_twice())
+
+    assert len(migrated_on) == 1 and migrated_on[0] != loop_thread
+    database.ledgers.get_open("household").dispose()
+
+
+def test_concurrent_creates_of_one_ledger_succeed_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "LEDGER_DIR", str(tmp_path / "ledgers"))
+    router = database.LedgerRouter()
+    barrier = threading.Barrier(4)
+    outcomes = []
+
+    def create():
+        barrier.wait()
+        try:
+            router.create("household")
+            outcomes.append("created")
+        except FileExistsError:
+            outcomes.append("exists")
+
+    threads = [threading.Thread(target=create) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(outcomes) == ["created", "exists", "exists", "exists"]
+    assert _schema_version(tmp_path / "ledgers" / "household.db") == len(database.MIGRATIONS)
+    router.get_open("household").dispose()
+
+
+def test_scheduler_start_is_idempotent():
+    async def empty_schedule():
+        return []
+
+    async def start_twice():
+        scheduler = RecurringScheduler(job=None, load_schedule=empty_schedule, name="test")
+        await asyncio.gather(scheduler.start(), scheduler.start())
+        task = scheduler._task
+        await scheduler.start()
+        tasks = [t for t in asyncio.all_tasks() if t.get_name() == "test"]
+        await scheduler.shutdown()
+        return task, tasks
+
+    task, tasks = asyncio.run(start_twice())
+    assert tasks == [task]
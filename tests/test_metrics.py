@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+import metrics
+
+
+def test_failed_statements_leave_no_timing_behind():
+    engine = create_engine("sqlite://")
+    # Importing api instruments every Engine already
+    if not event.contains(Engine, "before_cursor_execute", metrics._before_cursor_execute):
+        metrics.instrument_engine(engine)
+    stats = metrics.RequestStats()
+    token = metrics._request_stats.set(stats)
+    try:
+        with engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    conn.execute(text("SELECT * FROM missing_table"))
+            conn.execute(text("SELECT 1"))
+            assert conn.info == {}
+    finally:
+        metrics._request_stats.reset(token)
+    assert stats.statements == 1
+    assert 0 < stats.seconds < 1
@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import inspect, text
+
+import database
+
+# Tables as created by the first release, before any migration existed
+BASELINE_SCHEMA = [
+    "CREATE TABLE transactions (id INTEGER NOT NULL, date DATE, type VARCHAR, category VARCHAR, "
+    "amount FLOAT, notes VARCHAR, PRIMARY KEY (id))",
+    "CREATE TABLE asset_values (id INTEGER NOT NULL, date DATE, type VARCHAR, name VARCHAR, "
+    "amount FLOAT, PRIMARY KEY (id))",
+    "CREATE TABLE recurring_transactions (id INTEGER NOT NULL, name VARCHAR, amount FLOAT, "
+    "category VARCHAR, type VARCHAR, frequency VARCHAR, start_date DATE, next_run_date DATE, "
+    "is_active INTEGER, PRIMARY KEY (id))",
+]
+
+
+@pytest.fixture
+def baseline(engine):
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(
+            "INSERT INTO recurring_transactions (id, name, amount, category, type, frequency, "
+            "start_date, next_run_date, is_active) VALUES "
+            "(1, 'Rent', 900, 'Housing', 'Expense', 'Monthly', '2024-01-01', '2024-02-01', 1), "
+            "(2, 'Salary', 3000, 'Salary', 'Income', 'Monthly', '2024-01-25', '2024-02-25', 1)"
+        ))
+    return engine
+
+
+def test_recurring_ids_are_not_reused_after_upgrade(baseline, monkeypatch):
+    monkeypatch.setattr(database, "MIGRATIONS", database.MIGRATIONS[:6])
+    database.run_migrations(baseline)
+    with baseline.begin() as conn:
+        # Occurrences of item 3, deleted before the upgrade
+        conn.execute(text(
+            "INSERT INTO transactions (date, type, category, amount, notes, recurring_id, updated_seq) "
+            "VALUES ('2024-03-01', 'Expense', 'Bills', 10, 'Auto-generated: Gym', 3, 1)"
+        ))
+    monkeypatch.undo()
+
+    database.run_migrations(baseline)
+    with baseline.begin() as conn:
+        rows = conn.execute(text("SELECT id, name, next_run_date FROM recurring_transactions ORDER BY id")).all()
+        assert rows == [(1, 'Rent', '2024-02-01'), (2, 'Salary', '2024-02-25')]
+        indexes = {index['name'] for index in inspect(conn).get_indexes('recurring_transactions')}
+        assert indexes == {index.name for index in database.RecurringTransaction.__table__.indexes}
+        conn.execute(text("INSERT INTO recurring_transactions (name) VALUES ('Gym')"))
+        conn.execute(text("DELETE FROM recurring_transactions WHERE id = 4"))
+        conn.execute(text("INSERT INTO recurring_transactions (name) VALUES ('Gym')"))
+        assert conn.execute(text("SELECT MAX(id) FROM recurring_transactions")).scalar() == 5
+
+
+def test_baseline_database_upgrades_to_current_schema(baseline):
+    with baseline.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO transactions (date, type, category, amount, notes) VALUES "
+            "('2024-01-05', 'Expense', 'Food', 12.5, 'lunch'), ('2024-01-25', 'Income', 'Salary', 3000, NULL)"
+        ))
+
+    assert database.run_migrations(baseline) == len(database.MIGRATIONS)
+    with baseline.connect() as conn:
+        assert database.get_schema_version(conn) == len(database.MIGRATIONS)
+        inspector = inspect(conn)
+        for table in database.Base.metadata.sorted_tables:
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            assert columns == {column.name for column in table.columns}
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            assert indexes >= {index.name for index in table.indexes}
+        assert conn.execute(text("SELECT COUNT(*) FROM transaction_daily_rollups")).scalar() == 2
+        assert conn.execute(text(
+            "SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH 'lunch'"
+        )).scalar() == 1
+
+    # A second run finds nothing to do
+    database.run_migrations(baseline)
@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+
+import crud
+import schemas
+from database import Transaction
+
+
+def _daily(name, start):
+    return schemas.RecurringCreate(name=name, amount=10.0, category="Bills", type="Expense",
+                                   frequency="Daily", start_date=start)
+
+
+def test_recreated_item_does_not_inherit_deleted_items_occurrences(db):
+    start = date.today() - timedelta(days=9)
+    first = crud.create_recurring(db, _daily("Gym", start))
+    assert crud.process_recurring_transactions(db) == 10
+    crud.delete_recurring(db, first.id)
+
+    second = crud.create_recurring(db, _daily("Gym", start))
+    assert second.id != first.id
+    assert crud.process_recurring_transactions(db) == 10
+    assert db.query(Transaction).filter(Transaction.recurring_id == second.id).count() == 10
+
+
+def test_due_items_are_committed_in_batches(db):
+    start = date.today() - timedelta(days=2)
+    for number in range(5):
+        crud.create_recurring(db, _daily(f"Item {number}", start))
+    batches = []
+
+    processed = crud.process_recurring_transactions(
+        db, batch_size=2, on_batch=lambda: batches.append(db.query(Transaction).count())
+    )
+
+    assert processed == 15
+    assert batches == [6, 12, 15]
+    assert crud.process_recurring_transactions(db, batch_size=2, on_batch=batches.append) == 0
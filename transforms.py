@@ -0,0 +1,71 @@
+"""
+DataFrame transforms behind the Streamlit pages.
+
+Plain pandas, no Streamlit and no HTTP, so the benchmark suite in bench/
+can time them on generated data.
+"""
+import pandas as pd
+
+DAILY_TYPE_TOTAL_COLUMNS = ['date', 'type', 'amount']
+MONTHLY_TOTAL_COLUMNS = ['month', 'type', 'category', 'total', 'count']
+
+# --- Parsing ---
+def daily_type_totals_frame(columns):
+    """GET /analytics/daily/types by column as a DataFrame with `date` as datetime.date."""
+    daily = pd.DataFrame(columns, columns=DAILY_TYPE_TOTAL_COLUMNS)
+    daily['date'] = pd.to_datetime(daily['date']).dt.date
+    return daily
+
+def monthly_totals_frame(rows):
+    """GET /analytics/monthly rows as a DataFrame with `month` as datetime.date."""
+    monthly = pd.DataFrame(rows, columns=MONTHLY_TOTAL_COLUMNS)
+    monthly['month'] = pd.to_datetime(monthly['month']).dt.date
+    return monthly
+
+def balance_frame(points):
+    """GET /analytics/balance points as a DataFrame with `date` as datetime64."""
+    df = pd.DataFrame(points)
+    if not df.empty:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+# --- Mirror ---
+def merge_changes(frame, changed, deleted_ids=()):
+    """
+    Applies one GET /sync table to the local copy: rows in `changed` replace
+    their old version (matched by id), `deleted_ids` are dropped.
+    """
+    stale = set(deleted_ids) | (set(changed['id']) if not changed.empty else set())
+    if stale and not frame.empty:
+        frame = frame[~frame['id'].isin(stale)]
+    if not changed.empty:
+        frame = changed if frame.empty else pd.concat([frame, changed], ignore_index=True)
+    return frame
+
+# --- Dashboard ---
+def period_analysis(daily_totals, monthly_totals, start, end):
+    """
+    KPIs and chart data for [start, end], or None when the range has no
+    transactions. Totals and the trend come from the per-day frame; the
+    expense categories from the monthly one, so they cover every month the
+    range touches (`category_months` gives the first and last).
+    """
+    period = daily_totals[(daily_totals['date'] >= start) & (daily_totals['date'] <= end)]
+    if period.empty:
+        return None
+    type_totals = period.groupby('type')['amount'].sum()
+    income = type_totals.get('Income', 0.0)
+    expenses = type_totals.get('Expense', 0.0)
+
+    first_month, last_month = start.replace(day=1), end.replace(day=1)
+    months = monthly_totals[(monthly_totals['month'] >= first_month) & (monthly_totals['month'] <= last_month)]
+    expense_rows = months[months['type'] == 'Expense']
+    expense_categories = expense_rows.groupby('category', as_index=False)['total'].sum()
+    return {
+        "income": income,
+        "expenses": expenses,
+        "savings": income - expenses,
+        "expense_categories": expense_categories.rename(columns={'total': 'amount'}),
+        "category_months": (first_month, last_month),
+        "daily_trend": period,
+    }